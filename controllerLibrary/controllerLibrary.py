@@ -6,6 +6,43 @@ import os
 import json
 # Allows us to pretty print our data
 import pprint
+# Lets us set render globals up around a batch of screenshots
+from contextlib import contextmanager
+# Compress and decompress .ma.gz controllers
+import gzip
+# Copy between compressed and uncompressed files
+import shutil
+# Somewhere to export to before compressing, and to decompress to before importing
+import tempfile
+# Hash exported controllers so identical ones are only stored once
+import hashlib
+# Read statistics out of .ma files
+import re
+# Time how long exports take
+import time
+# Controller records still act like dictionaries
+try:
+	from collections.abc import MutableMapping
+except ImportError:
+	from collections import MutableMapping
+# Read many JSON files at once, so slow filesystems are bound by bandwidth instead of latency
+from multiprocessing.pool import ThreadPool
+# Controllers can be decompressed and prefetched from background threads
+import threading
+# Optional on-disk index of the library
+import libraryIndex
+# Lets us search through the names and info of our controllers
+import searchIndex
+# Keeps local copies of controllers from slow network libraries
+import libraryCache
+# Keeps the older versions of controllers that were saved over
+import libraryHistory
+
+# scandir reads a directory as a stream and hands back file info for free on Windows
+try:
+	from os import scandir
+except ImportError:
+	scandir = None
 
 # First, create a directory where we can save our controllers and their data
 USERAPPDIR = cmds.internalVar(userAppDir=True)
@@ -14,6 +51,69 @@ USERAPPDIR = cmds.internalVar(userAppDir=True)
 # Join userAppDir with name of our directory
 DIRECTORY = os.path.join(USERAPPDIR, 'controllerLibrary')
 
+# Show and studio libraries can be layered under ours by listing them in this environment variable
+# Earlier libraries override later ones, and ours always comes first
+ROOTS = [DIRECTORY] + [root for root in os.environ.get('CONTROLLER_LIBRARY_PATH', '').split(os.pathsep) if root]
+
+# Where local copies of controllers from other libraries are kept
+CACHEDIRECTORY = os.path.join(USERAPPDIR, 'controllerLibraryCache')
+
+# The formats controllers can be stored in, mapped to their extensions
+FORMATS = {
+	'mayaAscii': '.ma',
+	'mayaBinary': '.mb',
+	'mayaAsciiGzip': '.ma.gz',
+}
+
+# Extensions of the maya files we recognise, in the order we look for them if a controller has more than one
+MAYAEXTENSIONS = ('.ma', '.mb', '.ma.gz')
+
+# The other files that make up a saved controller
+EXTENSIONS = ('.json', '.jpg')
+
+# Folder inside a library holding the deduplicated controller files, named after a hash of their contents
+BLOBDIRECTORY = 'blobs'
+
+# Folder inside a library holding the older versions of each controller
+HISTORYDIRECTORY = 'history'
+
+# Where compressed controllers get decompressed to so Maya can read them, one folder per library
+DECOMPRESSEDDIRECTORY = os.path.join(USERAPPDIR, 'controllerLibraryDecompressed')
+
+# Namespace holding the hidden templates that repeated imports are duplicated from
+CACHENAMESPACE = 'controllerLibraryCache'
+
+# Size of the screenshot saved with each controller
+SCREENSHOTSIZE = 200
+
+# Where pre-rendered thumbnails are kept inside a library, one folder per size
+THUMBNAILDIRECTORY = 'thumbnails'
+
+# The thumbnail sizes the UI uses
+THUMBNAILSIZES = (64, 128, 256)
+
+# Lines of a .ma file creating a node, and the type of the node
+CREATENODE = re.compile(r'^createNode (\S+)')
+
+# Lines of a .ma file giving the number of vertices of a mesh
+VERTICES = re.compile(r'setAttr -s (\d+) "\.vt[\["]')
+
+# How many threads the UI reads the library with
+WORKERS = 8
+
+# How many controllers each thread is handed at a time
+WORKERCHUNKSIZE = 16
+
+# How much of a controller to read at a time when prefetching it
+PREFETCHCHUNKSIZE = 1024 * 1024
+
+# How many screenshotRenderGlobals() blocks we are inside of, so only the outermost one sets things up
+_renderGlobalsDepth = 0
+
+# Every root we've seen, so the controllers in a root share one copy of it.
+# intern() would do, but on Python 2 it refuses the unicode paths Maya hands us
+_roots = {}
+
 
 def createDirectory(directory=DIRECTORY):
 	"""
@@ -27,145 +127,1756 @@ def createDirectory(directory=DIRECTORY):
 		os.mkdir(directory)
 
 
-class ControllerLibrary(dict):
+def listDirectory(directory):
+	"""
+	Lists the files in the given directory
+	Args:
+		directory (str): The directory to list
 
-	def save(self, name, directory=DIRECTORY, screenshot=True, **info):
-		"""
-		Saves the scene
-		Args:
-			self (obj): reference itself
-			name (str): name of the file we want to save
-			directory (str): the directory to save to
+	Returns:
+		dict: file names mapped to their os.DirEntry (or None where scandir isn't available)
 
-		"""
+	"""
+	if scandir is None:
+		return dict.fromkeys(os.listdir(directory))
 
-		# Ensure directory we want to save to exists
-		createDirectory(directory)
+	return dict((entry.name, entry) for entry in scandir(directory))
 
-		# Create the path that we will be saving this to
-		path = os.path.join(directory, '%s.ma' % name)
 
-		# Write data to JSON - CREATE DICTIONARY TO SAVE DATA
-		infoFile = os.path.join(directory, '%s.json' % name)
+def listController(name, directory):
+	"""
+	Lists the files of a single controller, without listing the whole directory
+	Args:
+		name (str): name of the controller
+		directory (str): the directory it is saved in
 
-		info['name'] = name
-		info['path'] = path
+	Returns:
+		dict: file names mapped to None, in the same form as listDirectory()
 
-		# Saving requires some parameters...
-		# rename: rename it to the location we want to save it
-		# save: tell it to save
-		# type: specify what type to save it as
-		# force: if file already exists, you want save and override it-
-		cmds.file(rename=path)
+	"""
+	return dict.fromkeys(name + extension for extension in MAYAEXTENSIONS + EXTENSIONS
+						 if os.path.exists(os.path.join(directory, name + extension)))
 
-		# Saving selected items vs the entire scene
-		# If there is a selection, get the list of the selections
-		if cmds.ls(selection=True):
-			cmds.file(force=True, type='mayaAscii', exportSelected=True)
+
+def splitMayaFile(filename):
+	"""
+	Splits the name of a controller's maya file into the controller's name and its extension
+	Args:
+		filename (str): name of the file
+
+	Returns:
+		tuple: the name and extension, or (None, None) if it isn't a maya file we recognise
+
+	"""
+	for extension in MAYAEXTENSIONS:
+		# Checking .ma.gz before we split it, since splitext would only give us .gz
+		if filename.endswith(extension):
+			return filename[:-len(extension)], extension
+	return None, None
+
+
+def controllerNames(files):
+	"""
+	Gets the names of the controllers in a directory listing.
+	This includes JSON files without a maya file, since deduplicated controllers only have a JSON file
+	Args:
+		files (dict): the files in a directory, as returned by listDirectory()
+
+	Returns:
+		set
+
+	"""
+	names = set(splitMayaFile(f)[0] for f in files)
+	names.update(f[:-len('.json')] for f in files if f.endswith('.json'))
+	names.discard(None)
+	return names
+
+
+def mayaFile(name, files):
+	"""
+	Finds the maya file of a controller in a directory listing
+	Args:
+		name (str): name of the controller
+		files (dict): the files in its directory, as returned by listDirectory()
+
+	Returns:
+		str: name of the file, or None if it has none
+
+	"""
+	for extension in MAYAEXTENSIONS:
+		if name + extension in files:
+			return name + extension
+
+
+def localMayaFile(path):
+	"""
+	Gets a path to a controller that Maya can read, decompressing it first if it is gzipped.
+	Decompressed files are kept until the compressed one changes
+	Args:
+		path (str): path of the controller's maya file
+
+	Returns:
+		str
+
+	"""
+	if not path.endswith('.gz'):
+		return path
+
+	localPath = decompressedPath(os.path.dirname(path), os.path.basename(path)[:-len('.gz')])
+	mtime = os.path.getmtime(path)
+
+	# The copy gets the compressed file's mtime, so any change to it (even to an older file) is noticed
+	if not os.path.exists(localPath) or abs(os.path.getmtime(localPath) - mtime) >= 0.001:
+		# Decompress to a name of our own first, other threads may be reading or decompressing the same file
+		tempPath = '%s.%d.tmp' % (localPath, threading.current_thread().ident)
+		with gzip.open(path, 'rb') as source:
+			with open(tempPath, 'wb') as destination:
+				shutil.copyfileobj(source, destination)
+		os.utime(tempPath, (mtime, mtime))
+		if os.path.exists(localPath):
+			os.remove(localPath)
+		os.rename(tempPath, localPath)
+
+	return localPath
+
+
+def decompressedPath(directory, filename):
+	"""
+	Gets where a decompressed copy of a file is kept. Every library directory gets its own folder,
+	so controllers with the same name in different libraries don't clash
+	Args:
+		directory (str): the directory the compressed file is in
+		filename (str): name of the decompressed file
+
+	Returns:
+		str
+
+	"""
+	folder = os.path.join(DECOMPRESSEDDIRECTORY, hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16])
+	if not os.path.exists(folder):
+		try:
+			os.makedirs(folder)
+		except OSError:
+			# Another thread got there first
+			if not os.path.isdir(folder):
+				raise
+	return os.path.join(folder, filename)
+
+
+def exportMayaFile(path, fileFormat, **kwargs):
+	"""
+	Exports to a controller's maya file in the given format, compressing it if needed
+	Args:
+		path (str): path of the file to write
+		fileFormat (str): one of FORMATS
+		kwargs: what to export, passed on to cmds.file()
+
+	"""
+	if fileFormat != 'mayaAsciiGzip':
+		cmds.file(path, force=True, type=fileFormat, **kwargs)
+		return
+
+	# Maya can't write gzip, so export an ascii file somewhere else and compress it into the library
+	exportDirectory = tempfile.mkdtemp()
+	try:
+		exportPath = os.path.join(exportDirectory, 'export.ma')
+		cmds.file(exportPath, force=True, type='mayaAscii', **kwargs)
+		with open(exportPath, 'rb') as source:
+			with gzip.open(path, 'wb') as destination:
+				shutil.copyfileobj(source, destination)
+	finally:
+		shutil.rmtree(exportDirectory, ignore_errors=True)
+
+
+def contentHash(path):
+	"""
+	Hashes the contents of a maya file. Comments and fileInfo lines of ascii files are skipped,
+	since Maya writes the date, file name and a new UUID into them every time it saves
+	Args:
+		path (str): path of the file
+
+	Returns:
+		str
+
+	"""
+	digest = hashlib.sha1()
+	opener = gzip.open if path.endswith('.gz') else open
+
+	with opener(path, 'rb') as f:
+		if splitMayaFile(os.path.basename(path))[1] == '.mb':
+			for chunk in iter(lambda: f.read(1024 * 1024), b''):
+				digest.update(chunk)
 		else:
-			cmds.file(save=True, type='mayaAscii', force=True)
+			for line in f:
+				if not line.startswith(b'//') and not line.startswith(b'fileInfo'):
+					digest.update(line)
 
-		# Save the path of screenshot into the json dict
-		if screenshot:
-			info['screenshot'] = self.saveScreenshot(name, directory=directory)
+	return digest.hexdigest()
+
+
+def storeBlob(path, directory):
+	"""
+	Moves an exported controller into the library's blob store, unless an identical one is already there
+	Args:
+		path (str): path of the exported file, which is moved or deleted
+		directory (str): the library directory
+
+	Returns:
+		tuple: name of the blob and its path
+
+	"""
+	blobDirectory = os.path.join(directory, BLOBDIRECTORY)
+	createDirectory(blobDirectory)
+
+	blob = contentHash(path) + splitMayaFile(os.path.basename(path))[1]
+	blobPath = os.path.join(blobDirectory, blob)
+
+	# Identical controllers cost nothing more to store
+	if os.path.exists(blobPath):
+		os.remove(path)
+	else:
+		shutil.move(path, blobPath)
+
+	return blob, blobPath
+
+
+def removeOtherFormats(name, directory, extension):
+	"""
+	Deletes any copies of a controller saved in formats other than the one it was just saved in
+	Args:
+		name (str): name of the controller
+		directory (str): the directory it is saved in
+		extension (str): extension of the file to keep, or None to delete all of them
+
+	"""
+	for other in MAYAEXTENSIONS:
+		path = os.path.join(directory, name + other)
+		if other != extension and os.path.exists(path):
+			os.remove(path)
+
+
+def convertLibrary(fileFormat, directory=DIRECTORY):
+	"""
+	Converts every controller in a library to the given format.
+	Converting between .ma and .ma.gz only needs compressing, anything involving .mb
+	opens each controller in Maya, replacing the current scene, so run this from mayapy
+	Args:
+		fileFormat (str): one of FORMATS
+		directory (str): the library to convert
+
+	"""
+	extension = FORMATS[fileFormat]
+	files = listDirectory(directory)
+
+	for name in sorted(controllerNames(files)):
+		filename = mayaFile(name, files)
+		# Deduplicated controllers are left where they are
+		if filename is None or splitMayaFile(filename)[1] == extension:
+			continue
+
+		source = os.path.join(directory, filename)
+		destination = os.path.join(directory, name + extension)
+		localSource = localMayaFile(source)
+
+		if fileFormat == 'mayaAsciiGzip' and localSource.endswith('.ma'):
+			with open(localSource, 'rb') as f:
+				with gzip.open(destination, 'wb') as compressed:
+					shutil.copyfileobj(f, compressed)
+		elif fileFormat == 'mayaAscii' and localSource.endswith('.ma'):
+			shutil.copyfile(localSource, destination)
+		else:
+			cmds.file(localSource, open=True, force=True)
+			exportMayaFile(destination, fileFormat, exportAll=True)
 
+		removeOtherFormats(name, directory, extension)
 
+	# The index remembers where each file was, let it rebuild itself
+	index = libraryIndex.LibraryIndex(directory)
+	if os.path.exists(index.path):
+		os.remove(index.path)
 
-		# Open the file in WRITE mode, and store file in 'f'
-		# Use JSON to dump 'info' into f - indent all by 4 spaces
-		with open(infoFile, 'w') as f:
-			json.dump(info, f, indent=4)
 
-		# Fixes BUG 1 (Save path name in our controller library)	
-		self[name] = info
+@contextmanager
+def screenshotRenderGlobals():
+	"""
+	Sets the render globals up for our screenshots and puts them back afterwards.
+	Nested blocks do nothing, so a batch of screenshots only sets them up once
+	"""
+	global _renderGlobalsDepth
+	_renderGlobalsDepth += 1
+	if _renderGlobalsDepth > 1:
+		try:
+			yield
+		finally:
+			_renderGlobalsDepth -= 1
+		return
+
+	imageFormat = cmds.getAttr('defaultRenderGlobals.imageFormat')
+	# This is in RenderSettings for .jpg
+	cmds.setAttr('defaultRenderGlobals.imageFormat', 8)
+	try:
+		yield
+	finally:
+		cmds.setAttr('defaultRenderGlobals.imageFormat', imageFormat)
+		_renderGlobalsDepth -= 1
+
+
+def fileStat(filename, directory, files):
+	"""
+	Gets the (mtime, size) of a file in a directory listing
+	Args:
+		filename (str): name of the file
+		directory (str): the directory it is in
+		files (dict): the files in that directory, as returned by listDirectory()
+
+	Returns:
+		list: [mtime, size], or None if the file doesn't exist
+
+	"""
+	if filename not in files:
+		return None
+
+	# Reuse the stat scandir already made where we can
+	entry = files[filename]
+	if entry is not None:
+		stat = entry.stat()
+	else:
+		stat = os.stat(os.path.join(directory, filename))
+	return [stat.st_mtime, stat.st_size]
+
+
+def mayaFileStats(path):
+	"""
+	Counts what is in a .ma (or .ma.gz) file by reading it as text, without importing it
+	Args:
+		path (str): path of the file
+
+	Returns:
+		dict: the node count, node type histogram, CV count and vertex count
+
+	"""
+	nodeTypes = {}
+	cvCount = 0
+	vertexCount = 0
+	# The numbers of the curve being read, when its data spans several lines
+	curve = None
+
+	opener = gzip.open if path.endswith('.gz') else open
+	with opener(path, 'rb') as f:
+		for line in f:
+			line = line.decode('utf-8', 'replace')
+
+			match = CREATENODE.match(line)
+			if match:
+				nodeTypes[match.group(1)] = nodeTypes.get(match.group(1), 0) + 1
+				continue
+
+			if curve is None and '"nurbsCurve"' in line:
+				curve = []
+				line = line.split('"nurbsCurve"', 1)[1]
+			if curve is not None:
+				curve.extend(line.replace(';', ' ').split())
+				# Degree, spans, form, rational and dimension, then the knot count and knots, then the CV count
+				if len(curve) > 5 and len(curve) > 6 + int(curve[5]):
+					cvCount += int(curve[6 + int(curve[5])])
+					curve = None
+				continue
+
+			match = VERTICES.search(line)
+			if match:
+				vertexCount += int(match.group(1))
+
+	return {'nodeCount': sum(nodeTypes.values()), 'nodeTypes': nodeTypes,
+			'cvCount': cvCount, 'vertexCount': vertexCount}
+
+
+def sceneStats(nodes):
+	"""
+	Counts what is in the nodes we are exporting, asking the scene. For .mb files, which can't be read as text
+	Args:
+		nodes (list): the nodes being exported
+
+	Returns:
+		dict: the node count, node type histogram, CV count and vertex count
+
+	"""
+	nodes = cmds.ls(nodes, dag=True, long=True) or []
+
+	nodeTypes = {}
+	for node in nodes:
+		nodeType = cmds.nodeType(node)
+		nodeTypes[nodeType] = nodeTypes.get(nodeType, 0) + 1
+
+	curves = cmds.ls(nodes, type='nurbsCurve') or []
+	meshes = cmds.ls(nodes, type='mesh') or []
+
+	return {'nodeCount': len(nodes), 'nodeTypes': nodeTypes,
+			'cvCount': sum(len(cmds.ls('%s.cv[*]' % curve, flatten=True) or []) for curve in curves),
+			'vertexCount': sum(cmds.polyEvaluate(mesh, vertex=True) for mesh in meshes)}
+
+
+def exportStats(path, nodes, exportTime):
+	"""
+	Gets the statistics of a controller we just exported
+	Args:
+		path (str): path of the file we exported
+		nodes (list): the nodes we exported
+		exportTime (float): how long exporting took, in seconds
+
+	Returns:
+		dict
+
+	"""
+	# Reading the file back counts exactly what the background job counts for older controllers
+	if path.endswith(('.ma', '.ma.gz')):
+		stats = mayaFileStats(path)
+	else:
+		stats = sceneStats(nodes)
+
+	stats['fileSize'] = os.path.getsize(path)
+	stats['exportTime'] = round(exportTime, 3)
+	return stats
+
+
+def writeJson(path, data):
+	"""
+	Writes a JSON file through a temporary file, so anyone reading it never sees it half written
+	Args:
+		path (str): path of the JSON file
+		data (dict): what to write
+
+	"""
+	tempPath = '%s.%d.tmp' % (path, os.getpid())
+	# Open the file in WRITE mode, and store file in 'f'
+	with open(tempPath, 'w') as f:
+		json.dump(data, f, indent=4)
+	# Replaces the old file in one step where the OS can, Windows has to remove it first
+	try:
+		os.rename(tempPath, path)
+	except OSError:
+		os.remove(path)
+		os.rename(tempPath, path)
+
+
+def fingerprint(name, directory, files):
+	"""
+	Gets the (mtime, size) of the maya, JSON and screenshot files of a controller
+	Args:
+		name (str): name of the controller
+		directory (str): the directory it is saved in
+		files (dict): the files in that directory, as returned by listDirectory()
+
+	Returns:
+		list: one [mtime, size] pair per file, or None where the file doesn't exist
+
+	"""
+	return [fileStat(filename, directory, files)
+			for filename in [mayaFile(name, files)] + [name + extension for extension in EXTENSIONS]]
+
+
+def recordMissingStats(directory=DIRECTORY, workers=WORKERS):
+	"""
+	Records statistics for every controller in a library that was saved without them. The UI only does this for
+	local libraries, run this (from mayapy, on a machine close to it) for shared ones
+	Args:
+		directory (str): the library directory
+		workers (int): how many controllers to read at once
+
+	Returns:
+		list: names of the controllers that got statistics
+
+	"""
+	library = ControllerLibrary(useIndex=True, roots=[directory], workers=workers)
+	library.find()
+
+	names = library.missingStats()
+	library.saveStats(dict(library.mapNames(lambda name: (name, library.readStats(name)), names)))
+	return names
+
+
+class ControllerRecord(MutableMapping):
+	"""
+	The info of a single controller, kept compact for libraries left open all day.
+	Its name, root, path and screenshot live in slots, with the paths relative to the root
+	(which every controller in a root shares), and only the rest of its info gets a dictionary.
+	It still reads and writes like the info dictionaries it replaces.
+	Given a way to read its JSON file, it only does so the first time something in there is needed
+
+	"""
+
+	__slots__ = ('name', 'root', 'path', 'screenshot', 'extra', 'read')
+
+	# The keys that live in slots instead of the extra dictionary
+	FIELDS = ('name', 'path', 'root', 'screenshot')
+
+	# Files named after the controller are stored as just their extension, which every record shares
+	SUFFIXES = MAYAEXTENSIONS + ('.jpg',)
+
+
+	def __init__(self, name, root, path, screenshot=None, read=None):
+		self.name = name
+		# Every controller of a root points at the one string
+		self.root = _roots.setdefault(root, root)
+		self.path = self.compact(path)
+		self.screenshot = self.compact(screenshot)
+		# Any info besides the fields, or None if there isn't any
+		self.extra = None
+		# Reads the JSON file, until it has been read
+		self.read = read
 
 
-	def find(self, directory=DIRECTORY):
+	@classmethod
+	def fromInfo(cls, info):
 		"""
-		Find all saved controllers in the directory
+		Makes a record out of an info dictionary
 		Args:
-			self (obj): reference itself
-			directory (str): the directory to look in
+			info (dict): the info, with the name, path and root of the controller
+
+		Returns:
+			ControllerRecord
 
 		"""
-		# Clear dictionary
-		self.clear()
-		# Check if directory exists
-		# If it doesnt exist, there are no controllers saved
-		if not os.path.exists(directory):
+		record = cls(info['name'], info['root'], None)
+		record['path'] = info['path']
+		if info.get('screenshot'):
+			record['screenshot'] = info['screenshot']
+		record.setExtra(info)
+		return record
+
+
+	def load(self):
+		"""
+		Reads the JSON file if it hasn't been read yet
+		"""
+		if self.read is None:
 			return
 
-		# If it does exist, list all files in directory
-		files = os.listdir(directory)
-		# Filter out only maya files
-		mayaFiles = [f for f in files if f.endswith('.ma')]
+		info = self.read()
+		self.read = None
+		# What was set on us overrides what is in the file, just like readInfo() does
+		self.extra, pending = None, self.extra
+		self.setExtra(info)
+		if pending:
+			self.setExtra(pending)
 
-		# Loop through maya files and get name and store it to dictionary (with file path)
-		for ma in mayaFiles:
-			# Get the name without the extension
-			name, extension = os.path.splitext(ma)
-			# Get link to the file path for that file name
-			path = os.path.join(directory, ma)
-
-			infoFile = "%s.json" % name
-			if infoFile in files:
-				infoFile = os.path.join(directory, infoFile)
-				# Open the file in READ mode, and store file in 'f'
-				# Use JSON to load data and store it in 'info'
-				with open(infoFile, 'r') as f:
-					info = json.load(f)
-			else:
-				# If JSON not found, create an empty dict
-				info = {}
 
-			# Find screenshot
-			screenshot = '%s.jpg' % name
-			if screenshot in files:
-				info['screenshot'] = os.path.join(directory, name)
+	def setExtra(self, info):
+		"""
+		Stores the info that doesn't live in the slots
+		Args:
+			info (dict): the info to store
+		"""
+		for key, value in info.items():
+			# The JSON file's name and path were only right wherever it was saved
+			if key in ('name', 'path', 'root') or (key == 'screenshot' and self.screenshot is not None):
+				continue
+			if self.extra is None:
+				self.extra = {}
+			self.extra[key] = value
+
 
-			# Populate dict, in case no info is there
-			info['name'] = name
-			info['path'] = path
+	def compact(self, path):
+		"""
+		Shortens a path as far as we can: relative to the root if it is inside of it,
+		and down to its extension if it is named after the controller
+		Args:
+			path (str): the path
 
-			self[name] = info
+		Returns:
+			str
 
+		"""
+		if not path:
+			return path
+		if path.startswith(self.root + os.sep):
+			path = path[len(self.root) + 1:]
+		for suffix in self.SUFFIXES:
+			if path == self.name + suffix:
+				return suffix
+		return path
 
 
-	def load(self, name):
+	def expand(self, path):
+		"""
+		Turns a path shortened by compact() back into a full path
+		Args:
+			path (str): the shortened path
+
+		Returns:
+			str
+
+		"""
+		if path in self.SUFFIXES:
+			path = self.name + path
+		return os.path.join(self.root, path)
+
+
+	def __getitem__(self, key):
+		if key == 'name':
+			return self.name
+		if key == 'root':
+			return self.root
+		if key == 'path':
+			return self.expand(self.path)
+		if key == 'screenshot' and self.screenshot is not None:
+			return self.expand(self.screenshot)
+
+		if self.extra is None or key not in self.extra:
+			self.load()
+		if self.extra is None:
+			raise KeyError(key)
+		return self.extra[key]
+
+
+	def __setitem__(self, key, value):
+		if key == 'name':
+			# Paths named after the old name still point at the same files
+			path, screenshot = self.expand(self.path), self.screenshot and self.expand(self.screenshot)
+			self.name = value
+			self.path, self.screenshot = self.compact(path), self.compact(screenshot)
+		elif key == 'root':
+			self.root = _roots.setdefault(value, value)
+		elif key == 'path':
+			self.path = self.compact(value)
+		elif key == 'screenshot':
+			self.screenshot = self.compact(value)
+		else:
+			if self.extra is None:
+				self.extra = {}
+			self.extra[key] = value
+
+
+	def __delitem__(self, key):
+		if key == 'screenshot' and self.screenshot is not None:
+			self.screenshot = None
+			return
+		if key in self.FIELDS:
+			raise KeyError('%s is needed by every controller' % key)
+
+		self.load()
+		if self.extra is None:
+			raise KeyError(key)
+		del self.extra[key]
+
+
+	def __iter__(self):
+		self.load()
+		keys = ['name', 'path', 'root']
+		if self.screenshot is not None:
+			keys.append('screenshot')
+		if self.extra:
+			keys.extend(self.extra)
+		return iter(keys)
+
+
+	def __len__(self):
+		return len(list(iter(self)))
+
+
+	def __repr__(self):
+		return repr(dict(self))
+
+
+	def copy(self):
+		"""
+		Copies the record, without reading the JSON file
+		Returns:
+			ControllerRecord
+
+		"""
+		record = ControllerRecord(self.name, self.root, self.path, self.screenshot, self.read)
+		if self.extra is not None:
+			record.extra = dict(self.extra)
+		return record
+
+
+class ControllerLibrary(dict):
+
+	def __init__(self, useIndex=False, fileFormat='mayaAscii', deduplicate=False, roots=None, cachedRoots=(), workers=1,
+				 lazy=False):
 		"""
-		Load controller into the scene
-		
 		Args:
 			self (obj): reference itself
-			name (str): Name of file to load
+			useIndex (bool): keep an on-disk index of the library so find() reads it in one query
+			fileFormat (str): the format controllers are saved in, one of FORMATS
+			deduplicate (bool): store saved controllers in a blob store named by their contents,
+				so identical controllers are only stored once. Only exported saves can be deduplicated
+			roots (list): the library directories to merge together, earlier ones overriding later ones.
+				Controllers are saved to the first one
+			cachedRoots (list): the roots on slow network drives, read through a local cache
+			workers (int): how many threads to read controllers with. On network drives most of the time
+				goes into waiting on each file, so reading many at once makes find() much faster
+			lazy (bool): only list the controllers and their files in find(), reading each JSON file the first
+				time its info is needed. The index already lists everything in one query, so this only
+				applies without useIndex
 
 		"""
+		super(ControllerLibrary, self).__init__()
+		self.useIndex = useIndex
+		self.fileFormat = fileFormat
+		self.deduplicate = deduplicate
+		self.roots = list(roots or [DIRECTORY])
+		self.cachedRoots = set(cachedRoots)
+		self.cache = libraryCache.ReadThroughCache(CACHEDIRECTORY)
+		self.workers = workers
+		self.lazy = lazy and not useIndex
+		# Fingerprints of the files each controller was last read from (and the root they were in), used by refresh()
+		self.fingerprints = {}
+		# Kept in step with the library as controllers are added and removed
+		self.searchIndex = searchIndex.SearchIndex()
+
+
+	def __setitem__(self, name, info):
+		super(ControllerLibrary, self).__setitem__(name, info)
+		self.searchIndex.add(name, info)
+
+
+	def __delitem__(self, name):
+		super(ControllerLibrary, self).__delitem__(name)
+		self.searchIndex.remove(name)
+
+
+	def clear(self):
+		super(ControllerLibrary, self).clear()
+		self.searchIndex.clear()
+
+
+	def search(self, query):
+		"""
+		Finds the controllers whose name or info match a query
+		Args:
+			self (obj): reference itself
+			query (str): words to search for, matched by prefix. Use field:value to search a single info field
+
+		Returns:
+			set: names of the matching controllers
+
+		"""
+		# Searching needs everything, so read the JSON files we haven't yet all at once
+		if self.lazy:
+			unread = [name for name, info in self.items() if isinstance(info, ControllerRecord) and info.read is not None]
+			for loaded in self.mapNames(lambda name: self[name].load(), unread):
+				pass
+
+		return self.searchIndex.search(query)
+
+
+	def save(self, name, directory=None, screenshot=True, nodes=None, exportOnly=False, fileFormat=None, **info):
+		"""
+		Saves the scene
+		Args:
+			self (obj): reference itself
+			name (str): name of the file we want to save
+			directory (str): the directory to save to, defaults to the first root
+			nodes (list): the nodes to save, instead of the selection. Implies exportOnly
+			exportOnly (bool): only ever export the given nodes or the selection,
+				never renaming or saving the whole scene
+			fileFormat (str): the format to save in, one of FORMATS. Defaults to the library's format
+
+		"""
+		fileFormat = fileFormat or self.fileFormat
+		directory = directory or self.roots[0]
+
+		if nodes or exportOnly or self.deduplicate:
+			return self.export(name, nodes or cmds.ls(selection=True), directory=directory,
+								screenshot=screenshot, fileFormat=fileFormat, **info)
+
+		# Ensure directory we want to save to exists
+		createDirectory(directory)
+
+		# Create the path that we will be saving this to
+		extension = FORMATS[fileFormat]
+		path = os.path.join(directory, name + extension)
+
+		info['name'] = name
+		info['path'] = path
+
+		# Hold on to what we are about to save over, to keep it as an older version
+		history = self.history(name, directory)
+		snapshot = history.snapshot(self.readInfo(name, directory, listController(name, directory)))
+
+		# Saving requires some parameters...
+		# rename: rename it to the location we want to save it
+		# save: tell it to save
+		# type: specify what type to save it as
+		# force: if file already exists, you want save and override it-
+		# Saving selected items vs the entire scene
+		# If there is a selection, get the list of the selections
+		nodes = cmds.ls(selection=True)
+		started = time.time()
+		if fileFormat == 'mayaAsciiGzip':
+			# Maya can't save gzip, so the scene is exported and compressed instead,
+			# leaving its name alone rather than pointing the artist's next save at a temporary file
+			if nodes:
+				exportMayaFile(path, fileFormat, exportSelected=True)
+			else:
+				exportMayaFile(path, fileFormat, exportAll=True)
+		else:
+			cmds.file(rename=path)
+			if nodes:
+				cmds.file(force=True, type=fileFormat, exportSelected=True)
+			else:
+				cmds.file(save=True, type=fileFormat, force=True)
+
+		# Record what is in it, so artists can tell how heavy it is without importing it
+		info['stats'] = exportStats(path, nodes or cmds.ls(), time.time() - started)
+
+		removeOtherFormats(name, directory, extension)
+
+		# Save the path of screenshot into the json dict
+		if screenshot:
+			info['screenshot'] = self.saveScreenshot(name, directory=directory)
+
+		if snapshot:
+			history.record(snapshot)
+
+		self.saveInfo({name: info}, directory)
+
+
+	def export(self, name, nodes, directory=None, screenshot=True, fileFormat=None, **info):
+		"""
+		Exports just the given nodes to the library, leaving the scene's name alone
+		Args:
+			self (obj): reference itself
+			name (str): name of the file we want to save
+			nodes (list): the nodes to export
+			directory (str): the directory to save to, defaults to the first root
+			screenshot (bool): whether to save a screenshot of the nodes
+			fileFormat (str): the format to save in, one of FORMATS. Defaults to the library's format
+
+		"""
+		if not nodes:
+			cmds.warning("Nothing to save, select the controllers to export first")
+			return
+
+		self.saveMany({name: nodes}, directory=directory, screenshot=screenshot, fileFormat=fileFormat, **info)
+
+
+	def saveMany(self, controllers, directory=None, screenshot=True, fileFormat=None, **info):
+		"""
+		Exports many controllers to the library in one pass, leaving the scene's name alone.
+		Render globals are only set up once for all of the screenshots, and the JSON files
+		and index are written together at the end
+		Args:
+			self (obj): reference itself
+			controllers (dict): names of the controllers to save mapped to the nodes to export for each
+			directory (str): the directory to save to, defaults to the first root
+			screenshot (bool): whether to save a screenshot of each controller
+			fileFormat (str): the format to save in, one of FORMATS. Defaults to the library's format
+			info: extra info saved with every controller
+
+		"""
+		fileFormat = fileFormat or self.fileFormat
+		extension = FORMATS[fileFormat]
+		directory = directory or self.roots[0]
+
+		# Ensure directory we want to save to exists
+		createDirectory(directory)
+
+		entries = {}
+		selection = cmds.ls(selection=True)
+		try:
+			with screenshotRenderGlobals():
+				for name, nodes in sorted(controllers.items()):
+					if not nodes:
+						cmds.warning("Nothing to save for %s" % name)
+						continue
+
+					# Create the path that we will be saving this to
+					path = os.path.join(directory, name + extension)
+
+					entry = dict(info)
+					entry['name'] = name
+					entry['path'] = path
+
+					# Hold on to what we are about to save over, to keep it as an older version
+					history = self.history(name, directory)
+					snapshot = history.snapshot(self.readInfo(name, directory, listController(name, directory)))
+
+					# Exporting to a path writes just those nodes and never renames the scene
+					cmds.select(nodes, replace=True)
+					started = time.time()
+					if self.deduplicate:
+						# Export somewhere else first, the entry itself only points at the blob
+						exportDirectory = tempfile.mkdtemp()
+						try:
+							exportPath = os.path.join(exportDirectory, name + extension)
+							exportMayaFile(exportPath, fileFormat, exportSelected=True)
+							entry['blob'], entry['path'] = storeBlob(exportPath, directory)
+						finally:
+							shutil.rmtree(exportDirectory, ignore_errors=True)
+						removeOtherFormats(name, directory, None)
+					else:
+						exportMayaFile(path, fileFormat, exportSelected=True)
+						removeOtherFormats(name, directory, extension)
+
+					# Record what is in it, so artists can tell how heavy it is without importing it
+					entry['stats'] = exportStats(entry['path'], nodes, time.time() - started)
+
+					# Take the screenshot while our nodes are selected so the view fits around them
+					if screenshot:
+						entry['screenshot'] = self.saveScreenshot(name, directory=directory)
+
+					if snapshot:
+						history.record(snapshot)
+
+					entries[name] = entry
+		finally:
+			# Put the artist's selection back the way it was
+			if selection:
+				cmds.select(selection, replace=True)
+			else:
+				cmds.select(clear=True)
+
+			# Write the info of every controller that was exported, even if a later one failed,
+			# so none of them is left with a new file next to its old JSON file
+			self.saveInfo(entries, directory)
+
+
+	def saveInfo(self, entries, directory):
+		"""
+		Writes the info of controllers we just saved to their JSON files and keeps the library up to date
+		Args:
+			self (obj): reference itself
+			entries (dict): names of the controllers mapped to the info to save
+			directory (str): the directory to save to
+
+		"""
+		for name, info in entries.items():
+			# Write data to JSON - CREATE DICTIONARY TO SAVE DATA
+			infoFile = os.path.join(directory, '%s.json' % name)
+
+			# Use JSON to dump 'info' into the file - indent all by 4 spaces
+			writeJson(infoFile, info)
+
+			# Remember which library it is in, without saving that into the JSON file
+			info['root'] = directory
+
+			# Fixes BUG 1 (Save path name in our controller library)	
+			self[name] = info
+
+		# Keep the index in step with what we just wrote, in a single transaction
+		if self.useIndex and entries:
+			fingerprints = dict((name, fingerprint(name, directory, listController(name, directory)))
+								for name in entries)
+			libraryIndex.LibraryIndex(directory).update(entries, fingerprints)
+
+
+	def find(self, directory=None):
+		"""
+		Find all saved controllers in the directory
+		Args:
+			self (obj): reference itself
+			directory (str): the directory to look in, defaults to all of the roots
+
+		"""
+		# Run through everything iterFind() discovers, it stores each controller as it goes
+		for info in self.iterFind(directory):
+			pass
+
+
+	def iterFind(self, directory=None):
+		"""
+		Find all saved controllers in the directory, yielding each one as soon as it is read
+		Args:
+			self (obj): reference itself
+			directory (str): the directory to look in, defaults to all of the roots
+
+		Yields:
+			dict: the info of each controller found
+
+		"""
+		# Clear dictionary
+		self.clear()
+		self.fingerprints = {}
+
+		# List all files in the directories that exist
+		# If none of them exist, there are no controllers saved
+		scans = self.scan(directory)
+
+		if self.useIndex:
+			entries = {}
+			# Go from the lowest priority root up, so earlier roots override later ones
+			for root, files in reversed(scans):
+				rootEntries, rootFingerprints = self.readIndex(root, files)
+				entries.update(rootEntries)
+				for name, rootFingerprint in rootFingerprints.items():
+					self.fingerprints[name] = rootFingerprint + [root]
+
+			# Hand controllers back alphabetically so the UI can append them as they come
+			for name, info in sorted(entries.items()):
+				self[name] = self.localInfo(info, self.fingerprints[name])
+				yield self[name]
+			return
+
+		# Loop through maya files and get name and store it to dictionary (with file path)
+		# Alphabetically, so the UI can append them as they come
+		owners = self.owners(scans)
+		for name, info, nameFingerprint in self.mapNames(lambda name: self.readEntry(name, owners), sorted(owners)):
+			if info is None:
+				continue
+
+			# Remember what the files looked like so refresh() can tell when they change
+			self.fingerprints[name] = nameFingerprint
+			self[name] = info
+			yield self[name]
+
+
+	def readEntry(self, name, owners):
+		"""
+		Reads a single controller and fingerprints its files. Safe to run on any thread
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+			owners (dict): names of the controllers mapped to the (root, files) they come from
+
+		Returns:
+			tuple: the name, the info as it should be kept in the library (or None if it isn't
+				a controller) and the fingerprint
+
+		"""
+		root, files = owners[name]
+		info = self.readInfo(name, root, files)
+		nameFingerprint = fingerprint(name, root, files) + [root]
+		if info is not None:
+			info = self.localInfo(info, nameFingerprint)
+		return name, info, nameFingerprint
+
+
+	def mapNames(self, function, names):
+		"""
+		Runs a function over many controllers, on a pool of threads if the library has more than one worker.
+		Results come back in the same order as the names, however long each one took
+		Args:
+			self (obj): reference itself
+			function (function): the function to run, given the name of a controller
+			names (list): names of the controllers
+
+		Yields:
+			the result of the function for each name
+
+		"""
+		if self.workers <= 1 or len(names) < 2:
+			for name in names:
+				yield function(name)
+			return
+
+		pool = ThreadPool(min(self.workers, len(names)))
+		try:
+			for result in pool.imap(function, names, WORKERCHUNKSIZE):
+				yield result
+		finally:
+			# Also stops the threads if whoever is iterating stops early
+			pool.terminate()
+
+
+	def scan(self, directory=None):
+		"""
+		Lists the files in each root that exists
+		Args:
+			self (obj): reference itself
+			directory (str): a single directory to list instead of the roots
+
+		Returns:
+			list: (root, files) pairs, in priority order
+
+		"""
+		roots = [directory] if directory else self.roots
+		return [(root, listDirectory(root)) for root in roots if os.path.exists(root)]
+
+
+	def owners(self, scans):
+		"""
+		Works out which root each controller comes from, earlier roots overriding later ones
+		Args:
+			self (obj): reference itself
+			scans (list): (root, files) pairs as returned by scan()
+
+		Returns:
+			dict: names of the controllers mapped to the (root, files) they come from
+
+		"""
+		owners = {}
+		for root, files in scans:
+			for name in controllerNames(files):
+				owners.setdefault(name, (root, files))
+		return owners
+
+
+	def readInfo(self, name, directory, files):
+		"""
+		Reads the info of a single saved controller
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+			directory (str): the directory it is saved in
+			files (dict): the files in that directory, as returned by listDirectory()
+
+		Returns:
+			ControllerRecord: the info, or None if this is a JSON file left behind without its controller
+
+		"""
+		infoFile = "%s.json" % name
+		# Get link to the file path for that file name, whichever format it is in
+		filename = mayaFile(name, files)
+
+		# Read the JSON file now, unless it can wait until something in it is asked for
+		info = None
+		if infoFile in files and not (self.lazy and filename):
+			info = self.readJson(infoFile, directory, files)
+
+		if filename:
+			path = filename
+		elif info and info.get('blob'):
+			# Deduplicated controllers point at their file in the blob store
+			path = os.path.join(BLOBDIRECTORY, info['blob'])
+		else:
+			return None
+
+		# Find screenshot
+		screenshot = '%s.jpg' % name
+		if screenshot not in files:
+			screenshot = None
+
+		# Paths are kept relative to the directory
+		record = ControllerRecord(name, directory, path, screenshot)
+		if info is not None:
+			record.setExtra(info)
+		elif infoFile in files:
+			record.read = lambda: self.readJson(infoFile, directory, files)
+
+		return record
+
+
+	def readJson(self, infoFile, directory, files):
+		"""
+		Reads the JSON file of a controller
+		Args:
+			self (obj): reference itself
+			infoFile (str): name of the JSON file
+			directory (str): the directory it is saved in
+			files (dict): the files in that directory, as returned by listDirectory()
+
+		Returns:
+			dict
+
+		"""
+		infoPath = os.path.join(directory, infoFile)
+		# Read JSON files on network libraries from our local copy
+		if directory in self.cachedRoots:
+			infoPath = self.cache.fetch(infoPath, fileStat(infoFile, directory, files))
+		# Open the file in READ mode, and store file in 'f'
+		# Use JSON to load data and store it in 'info'
+		with open(infoPath, 'r') as f:
+			return json.load(f)
+
+
+	def localInfo(self, info, fingerprint):
+		"""
+		Points the screenshot of a controller from a network library at our local copy of it
+		Args:
+			self (obj): reference itself
+			info (dict): the info of the controller, as it is stored in its library
+			fingerprint (list): the fingerprint of the controller's files
+
+		Returns:
+			dict
+
+		"""
+		# Only screenshots that are actually there are copied
+		if info['root'] not in self.cachedRoots or not fingerprint[2]:
+			return info
+
+		info = info.copy()
+		info['screenshot'] = self.cache.fetch(info['screenshot'], fingerprint[2])
+		return info
+
+
+	def localPath(self, name):
+		"""
+		Gets a path to a controller's maya file that Maya can read quickly,
+		copying it from network libraries and decompressing it as needed
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+
+		Returns:
+			str
+
+		"""
+		info = self[name]
+		path = info['path']
+		if info.get('root') in self.cachedRoots:
+			path = self.cache.fetch(path)
+		return localMayaFile(path)
+
+
+	def prefetch(self, name):
+		"""
+		Gets a controller's maya file ready to load, so loading it doesn't wait on a slow disk or network.
+		Files from network libraries are copied into the local cache (and decompressed), files already
+		on this machine are read through once so they are in the OS's page cache. Safe to call from other threads
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+
+		Returns:
+			str: the path localPath() gives for the controller
+
+		"""
+		path = self.localPath(name)
+
+		# Nothing was copied or decompressed, so the file itself has to be read to be cached
+		if path == self[name]['path']:
+			with open(path, 'rb') as f:
+				while f.read(PREFETCHCHUNKSIZE):
+					pass
+
+		return path
+
+
+	def readIndex(self, directory, files):
+		"""
+		Reads the controllers from the on-disk index, only parsing the files it doesn't know about
+		Args:
+			self (obj): reference itself
+			directory (str): the directory to look in
+			files (dict): the files in that directory, as returned by listDirectory()
+
+		Returns:
+			tuple: dict of names to info dictionaries, dict of names to fingerprints
+
+		"""
+		index = libraryIndex.LibraryIndex(directory)
+		entries, fingerprints = index.read()
+		# Libraries we can't write to are still read from their index, we just can't fix it up
+		writable = os.access(directory, os.W_OK)
+
+		names = controllerNames(files)
+
+		# Controllers saved without going through our index (or copied in by hand)
+		unknown = names.difference(entries)
+		# Controllers that were deleted from the directory
+		missing = set(entries).difference(names)
+
+		if unknown:
+			added = {}
+			addedFingerprints = {}
+			read = lambda name: (name, self.readInfo(name, directory, files), fingerprint(name, directory, files))
+			for name, info, nameFingerprint in self.mapNames(read, sorted(unknown)):
+				# Leave out JSON files left behind without their controller
+				if info is not None:
+					added[name] = info
+					addedFingerprints[name] = nameFingerprint
+			if writable:
+				index.update(added, addedFingerprints)
+			entries.update(added)
+			fingerprints.update(addedFingerprints)
+
+		if missing:
+			if writable:
+				index.remove(missing)
+			for name in missing:
+				del entries[name]
+				del fingerprints[name]
+
+		# The index might have been copied from somewhere else
+		for name, info in list(entries.items()):
+			info['root'] = directory
+			entries[name] = ControllerRecord.fromInfo(info)
+
+		return entries, fingerprints
+
+
+	def refresh(self, directory=None):
+		"""
+		Updates the library in place, only re-reading controllers whose files changed since they were last read
+		Args:
+			self (obj): reference itself
+			directory (str): the directory to look in, defaults to all of the roots
+
+		Returns:
+			tuple: sorted lists of the added, changed and removed controller names
+
+		"""
+		owners = self.owners(self.scan(directory))
+		return self.patch(owners, set(owners).union(self))
+
+
+	def refreshNames(self, names):
+		"""
+		Updates just the given controllers in place, without listing the whole library.
+		For when we already know which controllers' files changed
+		Args:
+			self (obj): reference itself
+			names (list): names of the controllers to look at
+
+		Returns:
+			tuple: sorted lists of the added, changed and removed controller names
+
+		"""
+		owners = {}
+		for name in names:
+			# The first root holding any of the controller's files owns it, just like in find()
+			for root in self.roots:
+				files = listController(name, root)
+				if controllerNames(files):
+					owners[name] = (root, files)
+					break
+
+		return self.patch(owners, set(names))
+
+
+	def patch(self, owners, names):
+		"""
+		Brings some controllers up to date, only re-reading the ones whose files changed since they were last read
+		Args:
+			self (obj): reference itself
+			owners (dict): names of the controllers that exist mapped to the (root, files) they come from
+			names (set): names of the controllers to look at, any of them not in owners are removed
+
+		Returns:
+			tuple: sorted lists of the added, changed and removed controller names
+
+		"""
+		# A stat per file is far cheaper than opening and parsing it, especially over NFS
+		fingerprints = dict(self.mapNames(lambda name: (name, fingerprint(name, *owners[name]) + [owners[name][0]]),
+										  sorted(owners)))
+
+		added = sorted(name for name in fingerprints if name not in self)
+		changed = sorted(name for name in fingerprints
+						 if name in self and fingerprints[name] != self.fingerprints.get(name))
+		removed = sorted(name for name in names if name in self and name not in fingerprints)
+
+		# What we read, as it should be stored in each root's index
+		readEntries = {}
+		for name, info in self.mapNames(lambda name: (name, self.readInfo(name, *owners[name])), added + changed):
+			if info is not None:
+				readEntries[name] = info
+				self[name] = self.localInfo(info, fingerprints[name])
+				continue
+
+			# Only a JSON file was left behind, so this isn't a controller (or is no longer one)
+			del fingerprints[name]
+			if name in added:
+				added.remove(name)
+			else:
+				changed.remove(name)
+				removed.append(name)
+
+		removed.sort()
+		# Remember which root each removed controller was in, so we can take it out of that index
+		removedRoots = dict((name, self.fingerprints.get(name, [None] * 4)[3]) for name in removed)
+		for name in removed:
+			del self[name]
+			self.fingerprints.pop(name, None)
+
+		self.fingerprints.update(fingerprints)
+
+		# Keep the index of each root in step with what we found
+		if self.useIndex:
+			for root in set(info['root'] for info in readEntries.values()):
+				if os.access(root, os.W_OK):
+					entries = dict((name, info) for name, info in readEntries.items() if info['root'] == root)
+					libraryIndex.LibraryIndex(root).update(entries, dict((name, fingerprints[name][:3]) for name in entries))
+
+			for root in set(removedRoots.values()):
+				if root and os.path.exists(root) and os.access(root, os.W_OK):
+					libraryIndex.LibraryIndex(root).remove([name for name in removed if removedRoots[name] == root])
+
+		return added, changed, removed
+
+
+	def missingStats(self):
+		"""
+		Finds the controllers saved before statistics were recorded, that we can record them for
+		Args:
+			self (obj): reference itself
+
+		Returns:
+			list: sorted names of the controllers
+
+		"""
+		# Servers and packs are read only, and shared network libraries are left to an offline pass
+		# rather than every artist copying them over and rewriting their JSON files at once
+		writable = dict((root, root not in self.cachedRoots and os.path.isdir(root) and os.access(root, os.W_OK))
+						for root in self.roots)
+		return sorted(name for name, info in self.items()
+					  if writable.get(info['root']) and info.get('stats') is None)
+
+
+	def readStats(self, name):
+		"""
+		Works out the statistics of a saved controller from its file. Safe to call from other threads
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+
+		Returns:
+			dict: the statistics, without the export time, which only saving can measure
+
+		"""
+		path = self.localPath(name)
+		# Binary files can't be read without opening them in Maya, so they only get their size
+		stats = mayaFileStats(path) if path.endswith('.ma') else {}
+		stats['fileSize'] = os.path.getsize(self[name]['path'])
+		return stats
+
+
+	def saveStats(self, stats):
+		"""
+		Writes statistics into the JSON files of controllers that were saved without them
+		Args:
+			self (obj): reference itself
+			stats (dict): names of the controllers mapped to their statistics
+
+		Returns:
+			tuple: sorted lists of the added, changed and removed controller names
+
+		"""
+		for name, controllerStats in stats.items():
+			infoFile = os.path.join(self[name]['root'], '%s.json' % name)
+			info = {}
+			if os.path.exists(infoFile):
+				with open(infoFile, 'r') as f:
+					info = json.load(f)
+
+			info['stats'] = controllerStats
+			writeJson(infoFile, info)
+
+		# Re-read them like any other change, which keeps the fingerprints and the index up to date
+		return self.refreshNames(sorted(stats))
+
+
+	def sharedBlobs(self):
+		"""
+		Finds the deduplicated controllers that share the same file
+		Args:
+			self (obj): reference itself
+
+		Returns:
+			dict: names of blobs mapped to the sorted names of the controllers sharing them
+
+		"""
+		blobs = {}
+		for name, info in self.items():
+			if info.get('blob'):
+				blobs.setdefault(info['blob'], []).append(name)
+
+		return dict((blob, sorted(names)) for blob, names in blobs.items() if len(names) > 1)
+
+
+	def removeUnusedBlobs(self, directory=None):
+		"""
+		Deletes the files in the blob store that no controller points at anymore.
+		Every JSON file in the directory is read, controllers hidden by a higher root still keep their blobs
+		Args:
+			self (obj): reference itself
+			directory (str): the library directory, defaults to the first root
+
+		"""
+		directory = directory or self.roots[0]
+		blobDirectory = os.path.join(directory, BLOBDIRECTORY)
+		if not os.path.exists(blobDirectory):
+			return
+
+		files = listDirectory(directory)
+		infoFiles = sorted(f for f in files if f.endswith('.json'))
+		# A JSON file we can't read raises before anything is deleted
+		used = set(info.get('blob') for info in self.mapNames(lambda infoFile: self.readJson(infoFile, directory, files),
+															   infoFiles))
+		for blob in os.listdir(blobDirectory):
+			if blob not in used:
+				os.remove(os.path.join(blobDirectory, blob))
+
+
+	def load(self, name, namespace=None, useCache=False, reference=False):
+		"""
+		Load controller into the scene
+		
+		Args:
+			self (obj): reference itself
+			name (str): Name of file to load
+			namespace (str): namespace to import the controller into
+			useCache (bool): duplicate the controller from a hidden template in the scene
+				instead of reading its file again every time
+			reference (bool): reference the controller's file instead of importing it,
+				leaving its data in the library. Use importReferences() to import it for real later.
+				Controllers Maya can't reference straight from the library (compressed ones, or ones
+				served over HTTP or out of a pack) are imported instead
+
+		Returns:
+			list: the nodes that were imported
+
+		"""
+		if reference:
+			# Reference the library's own file, our local copies only exist on this machine
+			referencePath = self[name]['path']
+			if referencePath.endswith('.gz') or not os.path.isfile(referencePath):
+				cmds.warning("%s can't be referenced from the library, importing it instead" % name)
+			else:
+				# References always need a namespace, default to the controller's name
+				return cmds.file(referencePath, reference=True, namespace=namespace or name, returnNewNodes=True)
+
 		# Look up our content using dict method where 'self[name] is a dict'
-		path = self[name]['path']
+		# Controllers on network libraries are copied over, and compressed ones decompressed first
+		path = self.localPath(name)
+
+		if useCache:
+			return self.duplicateTemplate(self.loadTemplate(name, path), namespace)
+
 		# Give path to import(i)
-		cmds.file(path, i=True, usingNamespaces=False)
+		if namespace:
+			return cmds.file(path, i=True, namespace=namespace, returnNewNodes=True)
+		return cmds.file(path, i=True, usingNamespaces=False, returnNewNodes=True)
+
+
+	def loadMany(self, names, namespaces=None, useCache=False, reference=False):
+		"""
+		Load many controllers into the scene as a single undo, without redrawing the viewport in between
+		
+		Args:
+			self (obj): reference itself
+			names (list): Names of files to load
+			namespaces (dict): names mapped to the namespace to import each one into
+			useCache (bool): duplicate the controllers from hidden templates in the scene
+			reference (bool): reference the controllers' files instead of importing them
+
+		Returns:
+			dict: names mapped to the nodes that were imported for each
+
+		"""
+		namespaces = namespaces or {}
+		nodes = {}
+
+		cmds.undoInfo(openChunk=True, chunkName='loadControllers')
+		cmds.refresh(suspend=True)
+		try:
+			for name in names:
+				nodes[name] = self.load(name, namespace=namespaces.get(name), useCache=useCache, reference=reference)
+		finally:
+			# Always resume drawing and close the chunk, or Maya's undo queue is left broken
+			cmds.refresh(suspend=False)
+			cmds.undoInfo(closeChunk=True)
+
+		return nodes
+
+
+	def history(self, name, directory=None):
+		"""
+		Gets the older versions of a controller
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+			directory (str): the library it is saved in, defaults to the one it was found in
+
+		Returns:
+			libraryHistory.ControllerHistory
+
+		"""
+		directory = directory or self[name]['root']
+		return libraryHistory.ControllerHistory(os.path.join(directory, HISTORYDIRECTORY, name))
+
+
+	def versions(self, name):
+		"""
+		Lists every version of a controller
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+
+		Returns:
+			list: the version number, save time and info of each version, oldest first. The last one is current
+
+		"""
+		versions = self.history(name).versions()
+		info = self[name]
+		versions.append({'version': versions[-1]['version'] + 1 if versions else 1,
+						 'saved': os.path.getmtime(info['path']) if os.path.exists(info['path']) else None,
+						 'info': dict(info), 'screenshot': info.get('screenshot'), 'current': True})
+		return versions
+
+
+	def versionPath(self, name, version=None):
+		"""
+		Gets a path to a version of a controller's maya file that Maya can read, rebuilding older versions as needed
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+			version (int): the number of the version, defaults to the current one
+
+		Returns:
+			str
+
+		"""
+		history = self.history(name)
+		versions = history.versions()
+		# The current version is read exactly like it always has been
+		if version is None or not versions or version > versions[-1]['version']:
+			return self.localPath(name)
+
+		data, savedVersion = history.read(version)
+
+		path = decompressedPath(self[name]['root'], '%s.v%d%s' % (name, version, savedVersion['extension']))
+		# Write to a name of our own first, other threads may be reading the same version
+		tempPath = '%s.%d.tmp' % (path, threading.current_thread().ident)
+		with open(tempPath, 'wb') as f:
+			f.write(data)
+		if os.path.exists(path):
+			os.remove(path)
+		os.rename(tempPath, path)
+		return path
+
+
+	def loadVersion(self, name, version, namespace=None):
+		"""
+		Load an older version of a controller into the scene
+		
+		Args:
+			self (obj): reference itself
+			name (str): Name of the controller
+			version (int): the number of the version, as listed by versions()
+			namespace (str): namespace to import the controller into
+
+		Returns:
+			list: the nodes that were imported
+
+		"""
+		path = self.versionPath(name, version)
+
+		if namespace:
+			return cmds.file(path, i=True, namespace=namespace, returnNewNodes=True)
+		return cmds.file(path, i=True, usingNamespaces=False, returnNewNodes=True)
+
+
+	def importReferences(self, name):
+		"""
+		Turns every reference to a controller in the scene into a real import
+		
+		Args:
+			self (obj): reference itself
+			name (str): Name of the controller
+
+		"""
+		path = os.path.normcase(os.path.normpath(self[name]['path']))
+
+		for referenceFile in cmds.file(query=True, reference=True) or []:
+			# Strip the copy number Maya adds when a file is referenced more than once, like file.ma{1}
+			referencePath = os.path.normcase(os.path.normpath(referenceFile.split('{')[0]))
+			if referencePath == path:
+				cmds.file(referenceFile, importReference=True)
+
+
+	def loadTemplate(self, name, path):
+		"""
+		Imports a controller once into a hidden group, to be duplicated by later loads.
+		The template is imported again if the controller's file changed since
+		
+		Args:
+			self (obj): reference itself
+			name (str): Name of the controller
+			path (str): path of the controller's file
+
+		Returns:
+			str: the hidden group holding the template
+
+		"""
+		# Each template gets its own namespace so it can be thrown away with everything it imported
+		namespace = '%s:%s' % (CACHENAMESPACE, name)
+		group = '%s:template' % namespace
+		mtime = repr(os.path.getmtime(path))
+
+		if cmds.objExists(group):
+			if cmds.getAttr(group + '.sourceMtime') == mtime:
+				return group
+			# The file changed since we imported it
+			cmds.namespace(removeNamespace=namespace, deleteNamespaceContent=True)
+
+		if not cmds.namespace(exists=CACHENAMESPACE):
+			cmds.namespace(add=CACHENAMESPACE)
+
+		nodes = cmds.file(path, i=True, namespace=namespace, mergeNamespacesOnClash=True, returnNewNodes=True)
+
+		# Keep the template's top level nodes together under a hidden group
+		group = cmds.group(empty=True, name=group)
+		roots = cmds.ls(nodes, assemblies=True)
+		if roots:
+			cmds.parent(roots, group)
+		cmds.setAttr(group + '.visibility', False)
+		cmds.setAttr(group + '.hiddenInOutliner', True)
+
+		# Remember which version of the file this template came from
+		cmds.addAttr(group, longName='sourceMtime', dataType='string')
+		cmds.setAttr(group + '.sourceMtime', mtime, type='string')
+
+		return group
+
+
+	def duplicateTemplate(self, group, namespace=None):
+		"""
+		Makes a visible copy of a template in the scene
+		
+		Args:
+			self (obj): reference itself
+			group (str): the hidden group holding the template
+			namespace (str): namespace to put the copy in
+
+		Returns:
+			list: the nodes of the copy
+
+		"""
+		children = cmds.listRelatives(group, children=True, fullPath=True) or []
+		if not children:
+			return []
+
+		# New nodes are made in the current namespace
+		current = cmds.namespaceInfo(currentNamespace=True, absoluteName=True)
+		if namespace and not cmds.namespace(exists=namespace):
+			cmds.namespace(add=namespace)
+		cmds.namespace(set=':%s' % namespace if namespace else ':')
+		try:
+			# Copy any networks feeding into the template as well
+			copies = cmds.duplicate(children, upstreamNodes=True, returnRootsOnly=True)
+			# Move the copies out of the hidden group
+			copies = cmds.parent(copies, world=True)
+		finally:
+			cmds.namespace(set=current)
+
+		return cmds.ls(copies, dag=True, long=True)
+
+
+	def clearTemplates(self):
+		"""
+		Deletes every template from the scene
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		if cmds.namespace(exists=CACHENAMESPACE):
+			cmds.namespace(removeNamespace=CACHENAMESPACE, deleteNamespaceContent=True)
 
 
 
-	def saveScreenshot(self, name, directory=DIRECTORY):
+	def saveScreenshot(self, name, directory=None):
 		"""
 		Save screenshot into specified path
 		
 		Args:
 			self (obj): reference itself
-			directory (str): directory of where screenshot will be saved
+			directory (str): directory of where screenshot will be saved, defaults to the first root
 
 		"""
+		directory = directory or self.roots[0]
 		path = os.path.join(directory, '%s.jpg' % name)
 
 		# Ensure Maya viewer fits around our controller
 		cmds.viewFit()
-		# This is in RenderSettings for .jpg
-		cmds.setAttr('defaultRenderGlobals.imageFormat', 8)
-		# Render it out
-		# Ornaments - parts of viewpart are not in scene (overlays)
-		cmds.playblast(completeFilename=path, forceOverwrite=True, format='image', width=200, height=200,
-						showOrnaments=False, startTime=1, endTime=1, viewer=False)
+		with screenshotRenderGlobals():
+			# Render it out
+			# Ornaments - parts of viewpart are not in scene (overlays)
+			cmds.playblast(completeFilename=path, forceOverwrite=True, format='image', width=SCREENSHOTSIZE, height=SCREENSHOTSIZE,
+							showOrnaments=False, startTime=1, endTime=1, viewer=False)
 
 
 		return path
@@ -0,0 +1,107 @@
+# Interact with our OS
+import os
+# Copy files along with their modification times
+import shutil
+# Name the cache folder of each remote directory
+import hashlib
+# Files can be fetched from background threads while the UI fetches them too
+import threading
+
+
+class ReadThroughCache(object):
+	"""
+	Keeps local copies of files from slow (network) directories.
+	A copy is used for as long as the original's mtime and size haven't changed,
+	so browsing and loading the same files again only hits the local disk
+
+	"""
+
+	def __init__(self, directory):
+		# Where the local copies are kept
+		self.directory = directory
+		# Local paths mapped to a lock, so only one thread copies a file while the others wait for it
+		self.locks = {}
+		self.lock = threading.Lock()
+
+
+	def localPath(self, path):
+		"""
+		Gets where the local copy of a file is kept
+		Args:
+			path (str): path of the original file
+
+		Returns:
+			str
+
+		"""
+		# URLs are already absolute
+		if '://' not in path:
+			path = os.path.abspath(path)
+		# Every remote directory gets its own folder, so files with the same name don't clash
+		folder = hashlib.sha1(os.path.dirname(path).encode('utf-8')).hexdigest()[:16]
+		return os.path.join(self.directory, folder, os.path.basename(path))
+
+
+	def fetch(self, path, stat=None, copy=shutil.copyfile):
+		"""
+		Gets a local copy of a file, copying it over first if we don't have it or it changed
+		Args:
+			path (str): path of the original file
+			stat (list): the [mtime, size] of the original if we already know it, saving a round trip.
+				Required when the original isn't on a filesystem
+			copy (function): copies the original to a local path, for originals that aren't on a filesystem
+
+		Returns:
+			str: path of the local copy
+
+		"""
+		if stat is None:
+			original = os.stat(path)
+			stat = [original.st_mtime, original.st_size]
+
+		localPath = self.localPath(path)
+		with self.lock:
+			lock = self.locks.setdefault(localPath, threading.Lock())
+		with lock:
+			return self.update(path, localPath, stat, copy)
+
+
+	def update(self, path, localPath, stat, copy):
+		"""
+		Copies a file over unless our copy of it is current. Only one thread may update a local path at a time
+		Args:
+			path (str): path of the original file
+			localPath (str): path of the local copy
+			stat (list): the [mtime, size] of the original
+			copy (function): copies the original to a local path
+
+		Returns:
+			str: path of the local copy
+
+		"""
+		mtime, size = stat
+		if os.path.exists(localPath):
+			local = os.stat(localPath)
+			# Filesystems keep mtimes at different precisions, so allow a little slack
+			if local.st_size == size and abs(local.st_mtime - mtime) < 0.001:
+				return localPath
+		else:
+			folder = os.path.dirname(localPath)
+			if not os.path.exists(folder):
+				try:
+					os.makedirs(folder)
+				except OSError:
+					# Another thread got there first
+					if not os.path.isdir(folder):
+						raise
+
+		# Copy to a temporary name first so a half-copied file is never used
+		tempPath = localPath + '.tmp'
+		copy(path, tempPath)
+		# Give the copy the mtime we validated against
+		os.utime(tempPath, (mtime, mtime))
+		if os.path.exists(localPath):
+			os.remove(localPath)
+		os.rename(tempPath, localPath)
+
+		return localPath
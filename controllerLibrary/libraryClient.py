@@ -0,0 +1,353 @@
+from maya import cmds
+try:
+	from http.client import HTTPConnection, HTTPException, responses
+	from urllib.parse import quote, urlsplit
+except ImportError:
+	from httplib import HTTPConnection, HTTPException, responses
+	from urllib import quote
+	from urlparse import urlsplit
+# Interact with our OS
+import os
+# Use JSON module to read the index
+import json
+# Connection errors
+import socket
+# Limit how many connections are open at once
+import threading
+# Keep idle connections around for the next request
+from collections import deque
+from contextlib import contextmanager
+import controllerLibrary
+import libraryServer
+
+# Set this to the address of a library server (like http://host:8765) to browse it instead of the local library
+SERVER = os.environ.get('CONTROLLER_LIBRARY_SERVER')
+
+# How many connections to the server each client keeps open at most
+CONNECTIONS = 4
+
+# How long (in seconds) to wait on the server before giving up
+TIMEOUT = 30
+
+# How much of a download to write out at a time
+CHUNKSIZE = 1024 * 1024
+
+
+class LibraryClient(object):
+	"""
+	Talks to a library server over a small pool of keep-alive connections,
+	so a run of requests doesn't pay for a new connection each time
+
+	"""
+
+	def __init__(self, url, connections=CONNECTIONS, timeout=TIMEOUT):
+		self.url = url.rstrip('/')
+		parts = urlsplit(self.url)
+		self.host = parts.hostname
+		self.port = parts.port
+		self.prefix = parts.path
+		self.timeout = timeout
+
+		# Connections that are open and not being used right now
+		self.idle = deque()
+		self.semaphore = threading.BoundedSemaphore(connections)
+
+
+	@contextmanager
+	def open(self, path, headers=None):
+		"""
+		Sends a GET request on a pooled connection. The connection goes back into the pool
+		once the response has been read
+		Args:
+			path (str): path to request, relative to the server's address
+			headers (dict): extra headers to send
+
+		Yields:
+			HTTPResponse
+
+		"""
+		self.semaphore.acquire()
+		try:
+			for attempt in range(2):
+				try:
+					connection = self.idle.pop()
+				except IndexError:
+					connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+				try:
+					connection.request('GET', self.prefix + path, headers=headers or {})
+					response = connection.getresponse()
+				except (HTTPException, socket.error):
+					connection.close()
+					# The server may have closed a kept-alive connection, so try once more on a new one
+					if attempt:
+						raise
+					continue
+				break
+
+			try:
+				yield response
+				# Anything left unread would be mistaken for the next response
+				response.read()
+			except Exception:
+				connection.close()
+				raise
+
+			if response.will_close:
+				connection.close()
+			else:
+				self.idle.append(connection)
+		finally:
+			self.semaphore.release()
+
+
+	def get(self, path, etag=None):
+		"""
+		Gets a (small) response in one go
+		Args:
+			path (str): path to request, relative to the server's address
+			etag (str): the ETag of the copy we have, so the server can tell us it hasn't changed
+
+		Returns:
+			tuple: the status, the ETag and the body of the response
+
+		"""
+		headers = {'If-None-Match': etag} if etag else {}
+		with self.open(path, headers) as response:
+			return response.status, response.getheader('ETag'), response.read()
+
+
+	def download(self, path, localPath, etag=None):
+		"""
+		Downloads a file. An interrupted download is picked up where it stopped,
+		as long as the file on the server is still the same one
+		Args:
+			path (str): path to request, relative to the server's address
+			localPath (str): where to write the file
+			etag (str): the ETag of the file, needed to pick up an interrupted download
+
+		"""
+		partPath = localPath + '.part'
+		# The ETag of the version of the file the partial download is of
+		etagPath = partPath + '.etag'
+		headers = {}
+		if os.path.exists(partPath):
+			partEtag = None
+			if os.path.exists(etagPath):
+				with open(etagPath, 'r') as f:
+					partEtag = f.read()
+
+			if etag and partEtag == etag:
+				headers['Range'] = 'bytes=%d-' % os.path.getsize(partPath)
+				# The server sends the whole file instead if it changed since
+				headers['If-Range'] = etag
+			else:
+				# The partial download is of another version of the file, so it can't be picked up
+				os.remove(partPath)
+				if os.path.exists(etagPath):
+					os.remove(etagPath)
+
+		with self.open(path, headers) as response:
+			if response.status not in (200, 206):
+				raise IOError('Could not download %s%s (%d %s)' % (self.url, path, response.status, response.reason))
+
+			if response.status == 200:
+				# Remember which version we're downloading, in case we get interrupted
+				with open(etagPath, 'w') as f:
+					f.write(response.getheader('ETag') or '')
+
+			with open(partPath, 'ab' if response.status == 206 else 'wb') as f:
+				while True:
+					chunk = response.read(CHUNKSIZE)
+					if not chunk:
+						break
+					f.write(chunk)
+
+		if os.path.exists(localPath):
+			os.remove(localPath)
+		os.rename(partPath, localPath)
+		os.remove(etagPath)
+
+
+class RemoteLibrary(controllerLibrary.ControllerLibrary):
+	"""
+	A read-only controller library served by a library server. Files are downloaded into the local
+	cache as they are needed, and refreshing an unchanged library costs a single request
+	"""
+
+	def __init__(self, url, connections=CONNECTIONS, **kwargs):
+		self.client = LibraryClient(url, connections)
+		# Everything from the server goes through the local cache
+		kwargs['roots'] = [self.client.url]
+		kwargs['cachedRoots'] = [self.client.url]
+		super(RemoteLibrary, self).__init__(**kwargs)
+
+		# The ETag of the index we have, so the server can tell us when it hasn't changed
+		self.etag = None
+		# URLs of the library's files mapped to their [mtime, size]
+		self.stats = {}
+
+
+	def save(self, name, *args, **kwargs):
+		cmds.warning("%s is read only, controllers can't be saved to it" % self.client.url)
+
+
+	def saveMany(self, controllers, *args, **kwargs):
+		cmds.warning("%s is read only, controllers can't be saved to it" % self.client.url)
+
+
+	def iterFind(self, directory=None):
+		"""
+		Find all controllers on the server, yielding each one as soon as it is read
+		Args:
+			self (obj): reference itself
+			directory (str): ignored, the server only serves a single library
+
+		Yields:
+			dict: the info of each controller found
+
+		"""
+		# Clear dictionary
+		self.clear()
+		self.fingerprints = {}
+
+		status, etag, body = self.client.get('/index')
+		self.checkStatus(status)
+		self.etag = etag
+		entries, fingerprints = self.readIndex(body)
+
+		# Hand controllers back alphabetically so the UI can append them as they come
+		for name in sorted(entries):
+			self.fingerprints[name] = fingerprints[name]
+			self[name] = self.remoteInfo(entries[name])
+			yield self[name]
+
+
+	def refresh(self, directory=None):
+		"""
+		Updates the library in place, only re-reading controllers that changed on the server
+		Args:
+			self (obj): reference itself
+			directory (str): ignored, the server only serves a single library
+
+		Returns:
+			tuple: sorted lists of the added, changed and removed controller names
+
+		"""
+		status, etag, body = self.client.get('/index', self.etag)
+		# Nothing changed since we last asked
+		if status == 304:
+			return [], [], []
+
+		self.checkStatus(status)
+		self.etag = etag
+		entries, fingerprints = self.readIndex(body)
+
+		added = sorted(name for name in fingerprints if name not in self)
+		changed = sorted(name for name in fingerprints
+						 if name in self and fingerprints[name] != self.fingerprints.get(name))
+		removed = sorted(name for name in self if name not in fingerprints)
+
+		for name in added + changed:
+			self[name] = self.remoteInfo(entries[name])
+		for name in removed:
+			del self[name]
+
+		self.fingerprints = fingerprints
+		return added, changed, removed
+
+
+	def checkStatus(self, status):
+		"""
+		Makes sure the server sent us its index, rather than an error page
+		Args:
+			self (obj): reference itself
+			status (int): the status of the response
+
+		"""
+		if status != 200:
+			raise IOError('Could not read the index of %s (%d %s)' % (self.client.url, status, responses.get(status, '')))
+
+
+	def readIndex(self, body):
+		"""
+		Reads the index sent by the server
+		Args:
+			self (obj): reference itself
+			body (bytes): the index
+
+		Returns:
+			tuple: dict of names to info dictionaries, dict of names to fingerprints
+
+		"""
+		index = json.loads(body.decode('utf-8'))
+		self.stats = dict((self.fileUrl(path), stat) for path, stat in index['stats'].items())
+		fingerprints = dict((name, fingerprint + [self.client.url])
+							for name, fingerprint in index['fingerprints'].items())
+		return index['entries'], fingerprints
+
+
+	def fileUrl(self, path):
+		"""
+		Gets the URL of one of the library's files
+		Args:
+			self (obj): reference itself
+			path (str): path of the file, relative to the library
+
+		Returns:
+			str
+
+		"""
+		return '%s/files/%s' % (self.client.url, quote(path))
+
+
+	def remoteInfo(self, info):
+		"""
+		Points the paths of a controller's info at the server, and its screenshot at our local copy
+		Args:
+			self (obj): reference itself
+			info (dict): the info of the controller, as the server sent it
+
+		Returns:
+			dict
+
+		"""
+		info['root'] = self.client.url
+		info['path'] = self.fileUrl(info['path'])
+		if info.get('screenshot'):
+			info['screenshot'] = self.fetch(self.fileUrl(info['screenshot']))
+		return info
+
+
+	def fetch(self, url):
+		"""
+		Gets a local copy of one of the library's files, only downloading it if ours is missing or outdated
+		Args:
+			self (obj): reference itself
+			url (str): URL of the file
+
+		Returns:
+			str: path of the local copy
+
+		"""
+		stat = self.stats[url]
+		path = url[len(self.client.url):]
+
+		def download(url, localPath):
+			self.client.download(path, localPath, libraryServer.fileTag(stat))
+
+		return self.cache.fetch(url, stat, copy=download)
+
+
+	def localPath(self, name):
+		"""
+		Gets a path to a controller's maya file that Maya can read, downloading and decompressing it as needed
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+
+		Returns:
+			str
+
+		"""
+		return controllerLibrary.localMayaFile(self.fetch(self[name]['path']))
@@ -0,0 +1,307 @@
+# Interact with our OS
+import os
+# Use JSON module to list the versions and write out deltas
+import json
+# Compress deltas and full copies
+import zlib
+# Find lines again between versions
+import bisect
+# Check versions are rebuilt exactly as they were saved
+import hashlib
+# Read compressed controllers
+import gzip
+
+# Name of the file listing the older versions of a controller, inside its history folder
+VERSIONSFILE = 'versions.json'
+
+# Controllers saved in these formats are text, so older versions can be kept as line deltas
+TEXTEXTENSIONS = ('.ma', '.ma.gz')
+
+# How hard to compress deltas and full copies, saving waits on it
+COMPRESSION = 6
+
+
+def readMayaFile(path):
+	"""
+	Reads a controller's maya file, decompressing it if it is gzipped
+	Args:
+		path (str): path of the maya file
+
+	Returns:
+		bytes
+
+	"""
+	opener = gzip.open if path.endswith('.gz') else open
+	with opener(path, 'rb') as f:
+		return f.read()
+
+
+def contentHash(data):
+	"""
+	Gets a hash of a version, to check it is rebuilt exactly as it was saved
+	Args:
+		data (bytes): the version
+
+	Returns:
+		str
+
+	"""
+	return hashlib.sha1(data).hexdigest()
+
+
+def makeDelta(old, new):
+	"""
+	Works out how to rebuild an old version of a file out of the newer one, a line at a time.
+	Each line of the old version is looked up in the newer one and copied from there when it's found,
+	continuing from where the last copied line was, so heavy files are diffed in a single pass
+	Args:
+		old (bytes): the old version
+		new (bytes): the newer version
+
+	Returns:
+		list: [start, end] pairs for lines copied from the newer version, and strings for lines only the old one has
+
+	"""
+	newLines = new.splitlines(True)
+	oldLines = old.splitlines(True)
+
+	# Where each line of the newer version is
+	positions = {}
+	for position, line in enumerate(newLines):
+		positions.setdefault(line, []).append(position)
+
+	delta = []
+	# Lines only the old version has, waiting to be added to the delta in one go
+	inserted = []
+	# The line after the last one we copied from the newer version
+	end = 0
+	for line in oldLines:
+		# Keep copying while the old version carries on like the newer one
+		if not inserted and delta and isinstance(delta[-1], list) and end < len(newLines) and newLines[end] == line:
+			delta[-1][1] += 1
+			end += 1
+			continue
+
+		found = positions.get(line)
+		if not found:
+			inserted.append(line)
+			continue
+
+		if inserted:
+			# latin-1 maps every byte to a character, so any file survives the trip through JSON
+			delta.append(b''.join(inserted).decode('latin-1'))
+			inserted = []
+
+		# Prefer the next copy of the line after the last one we copied, files mostly keep their order
+		index = bisect.bisect_left(found, end)
+		position = found[index] if index < len(found) else found[0]
+		delta.append([position, position + 1])
+		end = position + 1
+
+	if inserted:
+		delta.append(b''.join(inserted).decode('latin-1'))
+	return delta
+
+
+def applyDelta(new, delta):
+	"""
+	Rebuilds an old version of a file out of the newer one
+	Args:
+		new (bytes): the newer version
+		delta (list): the delta made by makeDelta()
+
+	Returns:
+		bytes: the old version
+
+	"""
+	newLines = new.splitlines(True)
+
+	old = []
+	for part in delta:
+		if isinstance(part, list):
+			old.extend(newLines[part[0]:part[1]])
+		else:
+			old.append(part.encode('latin-1'))
+	return b''.join(old)
+
+
+class ControllerHistory(object):
+	"""
+	The older versions of a controller. The current version stays where it always was, so loading it costs
+	nothing extra, and the history never depends on it: the newest older version is kept as a compressed full
+	copy, and each version of a text controller before it as a compressed delta against the version saved
+	after it. Saving only ever adds one full copy and turns the previous one into a small delta.
+	Binary controllers can't be diffed by line, so they stay full copies
+
+	"""
+
+	def __init__(self, directory):
+		# The controller's own folder in the library's history
+		self.directory = directory
+		self.versionsFile = os.path.join(directory, VERSIONSFILE)
+
+
+	def versions(self):
+		"""
+		Lists the older versions of the controller
+		Returns:
+			list: the info of each version, oldest first
+
+		"""
+		if not os.path.exists(self.versionsFile):
+			return []
+
+		with open(self.versionsFile, 'r') as f:
+			versions = json.load(f)
+
+		for version in versions:
+			if version.get('screenshot'):
+				version['screenshot'] = os.path.join(self.directory, version['screenshot'])
+		return versions
+
+
+	def snapshot(self, info):
+		"""
+		Reads what the controller is right now, before saving replaces it
+		Args:
+			info (dict): the info of the controller, as it is saved now. None if it hasn't been saved yet
+
+		Returns:
+			dict: its maya file, info and screenshot, or None if there is nothing to keep
+
+		"""
+		if info is None or not os.path.exists(info['path']):
+			return None
+
+		screenshot = None
+		if info.get('screenshot') and os.path.exists(info['screenshot']):
+			with open(info['screenshot'], 'rb') as f:
+				screenshot = f.read()
+
+		# Where the controller is saved is no use once it's been replaced
+		savedInfo = dict((key, value) for key, value in info.items() if key not in ('name', 'path', 'root', 'screenshot'))
+
+		return {'data': readMayaFile(info['path']), 'path': info['path'],
+				'saved': os.path.getmtime(info['path']), 'info': savedInfo, 'screenshot': screenshot}
+
+
+	def readStored(self, version):
+		"""
+		Reads the file a version is stored in
+		Args:
+			version (dict): the version, from versions()
+
+		Returns:
+			bytes: the full copy, or the delta as JSON
+
+		"""
+		with open(os.path.join(self.directory, version['file']), 'rb') as f:
+			return zlib.decompress(f.read())
+
+
+	def write(self, filename, data):
+		"""
+		Writes a file into the history, through a temporary file so a crash never leaves it half written
+		Args:
+			filename (str): name of the file
+			data (bytes): what to write
+
+		"""
+		path = os.path.join(self.directory, filename)
+		tempPath = path + '.tmp'
+		with open(tempPath, 'wb') as f:
+			f.write(data)
+		if os.path.exists(path):
+			os.remove(path)
+		os.rename(tempPath, path)
+
+
+	def record(self, snapshot):
+		"""
+		Keeps a snapshot as the newest of the older versions, once the controller has been saved over it
+		Args:
+			snapshot (dict): what the controller was, from snapshot()
+
+		Returns:
+			int: the number of the version that was kept
+
+		"""
+		versions = self.versions()
+		number = versions[-1]['version'] + 1 if versions else 1
+
+		if not os.path.exists(self.directory):
+			os.makedirs(self.directory)
+
+		data = snapshot['data']
+		version = {'version': number, 'saved': snapshot['saved'], 'info': snapshot['info'], 'screenshot': None,
+				   'file': '%d.full' % number, 'hash': contentHash(data),
+				   'extension': '.ma' if snapshot['path'].endswith(TEXTEXTENSIONS) else '.mb'}
+		self.write(version['file'], zlib.compress(data, COMPRESSION))
+
+		if snapshot['screenshot']:
+			version['screenshot'] = '%d.jpg' % number
+			self.write(version['screenshot'], snapshot['screenshot'])
+
+		# The previous full copy can now be rebuilt out of this one
+		replaced = None
+		previous = versions[-1] if versions else None
+		if previous and previous['file'].endswith('.full') and previous['extension'] == '.ma' \
+				and version['extension'] == '.ma':
+			delta = makeDelta(self.readStored(previous), data)
+			replaced = previous['file']
+			previous['file'] = '%d.delta' % previous['version']
+			self.write(previous['file'], zlib.compress(json.dumps(delta).encode('utf-8'), COMPRESSION))
+
+		# Keep the screenshots relative, so the library can be moved
+		for savedVersion in versions:
+			if savedVersion.get('screenshot'):
+				savedVersion['screenshot'] = os.path.basename(savedVersion['screenshot'])
+		versions.append(version)
+		self.write(VERSIONSFILE, json.dumps(versions, indent=4).encode('utf-8'))
+
+		# Only drop the full copy once the list no longer points at it
+		if replaced:
+			os.remove(os.path.join(self.directory, replaced))
+
+		return number
+
+
+	def read(self, number):
+		"""
+		Rebuilds an older version of the controller, working back from the newest full copy before it
+		Args:
+			number (int): the number of the version
+
+		Returns:
+			tuple: the maya file of the version, and its info from versions()
+
+		"""
+		versions = self.versions()
+		numbers = [version['version'] for version in versions]
+		if number not in numbers:
+			raise KeyError('%s has no version %d' % (self.directory, number))
+
+		# Start from the first full copy at or after the version, each delta rebuilds a version out of the one after it
+		chain = versions[numbers.index(number):]
+		for length, version in enumerate(chain, 1):
+			if version['file'].endswith('.full'):
+				chain = chain[:length]
+				break
+
+		data = None
+		for version in reversed(chain):
+			stored = self.readStored(version)
+			if version['file'].endswith('.delta'):
+				if data is None:
+					raise IOError('%s has a delta for version %d with nothing after it to rebuild it from'
+								  % (self.directory, version['version']))
+				data = applyDelta(data, json.loads(stored.decode('utf-8')))
+			else:
+				data = stored
+
+			# Anything edited or lost in the history would otherwise rebuild into the wrong file without a word
+			if contentHash(data) != version['hash']:
+				raise IOError('Version %d in %s does not rebuild into the file that was saved'
+							  % (version['version'], self.directory))
+
+		return data, versions[numbers.index(number)]
@@ -0,0 +1,203 @@
+# Use SQLite as a single-file database for our index
+import sqlite3
+# Interact with our OS
+import os
+# Use JSON module to store info dictionaries inside the database
+import json
+
+# Name of the index file that lives inside the library directory
+INDEXNAME = 'controllerLibrary.db'
+
+# Bump this whenever the table layout changes so old index files get rebuilt
+VERSION = 3
+
+# The info keys holding paths, stored relative to the library so it reads the same wherever it is mounted
+PATHFIELDS = ('path', 'screenshot')
+
+
+class LibraryIndex(object):
+	"""
+	An on-disk index of the controllers saved in a library directory.
+	Stores each controller's info dictionary and file fingerprint so the library
+	can be listed with a single query instead of reading every JSON file.
+	It only caches what is on disk, so when it can't be used it reads as empty and the library is scanned instead
+
+	"""
+
+	def __init__(self, directory):
+		# The index file is stored next to the controllers it describes
+		self.directory = directory
+		self.path = os.path.join(directory, INDEXNAME)
+
+
+	def connect(self):
+		"""
+		Opens a connection to the index file and makes sure our table exists
+		Returns:
+			sqlite3.Connection
+
+		"""
+		connection = sqlite3.connect(self.path)
+		try:
+			# The index only caches what is on disk, so an outdated layout can just be thrown away
+			version = connection.execute('PRAGMA user_version').fetchone()[0]
+			if version != VERSION:
+				# Libraries we can't write to keep their old index until someone who can opens them
+				if not self.isWritable():
+					raise sqlite3.OperationalError('%s is out of date and read only' % self.path)
+				connection.execute('DROP TABLE IF EXISTS entries')
+				connection.execute('PRAGMA user_version=%d' % VERSION)
+				connection.execute('CREATE TABLE entries (name TEXT PRIMARY KEY, info TEXT, fingerprint TEXT)')
+		except sqlite3.DatabaseError:
+			connection.close()
+			raise
+
+		return connection
+
+
+	def isWritable(self):
+		"""
+		Checks whether we can write to the index
+		Returns:
+			bool
+
+		"""
+		if os.path.exists(self.path):
+			return os.access(self.path, os.W_OK)
+		return os.access(self.directory, os.W_OK)
+
+
+	def recover(self, error):
+		"""
+		Deals with an index that couldn't be used. A corrupt index is deleted so it gets rebuilt,
+		one that is only locked or read only is left alone
+		Args:
+			error (sqlite3.DatabaseError): what went wrong
+
+		"""
+		if isinstance(error, sqlite3.OperationalError) or not self.isWritable():
+			return
+
+		try:
+			os.remove(self.path)
+		except OSError:
+			pass
+
+
+	def relativePaths(self, info):
+		"""
+		Makes the paths of a controller's info relative to the library, as they are stored in the index.
+		Paths outside of the library are kept as they are
+		Args:
+			info (dict): the info of the controller
+
+		Returns:
+			dict: a copy of the info
+
+		"""
+		info = dict(info)
+		# Where the library is mounted is up to whoever reads it
+		info.pop('root', None)
+
+		prefix = os.path.join(self.directory, '')
+		for field in PATHFIELDS:
+			if info.get(field) and info[field].startswith(prefix):
+				# Forward slashes, so an index written on Windows reads anywhere else and the other way around
+				info[field] = info[field][len(prefix):].replace(os.sep, '/')
+		return info
+
+
+	def absolutePaths(self, info):
+		"""
+		Turns the paths stored in the index back into paths inside of the library, wherever it is now
+		Args:
+			info (dict): the info of the controller, as stored in the index
+
+		Returns:
+			dict
+
+		"""
+		for field in PATHFIELDS:
+			if info.get(field) and not os.path.isabs(info[field]):
+				info[field] = os.path.join(self.directory, info[field].replace('/', os.sep))
+		return info
+
+
+	def read(self):
+		"""
+		Reads every controller stored in the index
+		Returns:
+			tuple: dict of names to info dictionaries, dict of names to fingerprints
+
+		"""
+		if not os.path.exists(self.path):
+			return {}, {}
+
+		try:
+			connection = self.connect()
+			try:
+				rows = connection.execute('SELECT name, info, fingerprint FROM entries').fetchall()
+			finally:
+				connection.close()
+		except sqlite3.DatabaseError as error:
+			self.recover(error)
+			return {}, {}
+
+		entries = {}
+		fingerprints = {}
+		for name, info, fingerprint in rows:
+			entries[name] = self.absolutePaths(json.loads(info))
+			fingerprints[name] = json.loads(fingerprint)
+
+		return entries, fingerprints
+
+
+	def update(self, entries, fingerprints):
+		"""
+		Adds or replaces controllers in the index
+		Args:
+			entries (dict): controller names mapped to their info dictionaries
+			fingerprints (dict): controller names mapped to their file fingerprints
+
+		Returns:
+			bool: whether the index was updated
+
+		"""
+		try:
+			connection = self.connect()
+			try:
+				# A single transaction for all of the entries
+				with connection:
+					connection.executemany('INSERT OR REPLACE INTO entries (name, info, fingerprint) VALUES (?, ?, ?)',
+											[(name, json.dumps(self.relativePaths(info)), json.dumps(fingerprints.get(name)))
+											 for name, info in entries.items()])
+			finally:
+				connection.close()
+		except sqlite3.DatabaseError as error:
+			# The controllers are saved either way, the index catches up when it's next read
+			self.recover(error)
+			return False
+		return True
+
+
+	def remove(self, names):
+		"""
+		Removes controllers from the index
+		Args:
+			names (list): names of the controllers to remove
+
+		Returns:
+			bool: whether the index was updated
+
+		"""
+		try:
+			connection = self.connect()
+			try:
+				with connection:
+					connection.executemany('DELETE FROM entries WHERE name = ?', [(name,) for name in names])
+			finally:
+				connection.close()
+		except sqlite3.DatabaseError as error:
+			self.recover(error)
+			return False
+		return True
@@ -0,0 +1,382 @@
+from maya import cmds
+# Interact with our OS
+import os
+# Use JSON module to write out the pack's index
+import json
+# Memory map packs so browsing them only reads the index
+import mmap
+# Pack the index length into bytes
+import struct
+import sys
+import controllerLibrary
+import libraryIndex
+
+# Set this to a pack file to browse it instead of the local library
+PACK = os.environ.get('CONTROLLER_LIBRARY_PACK')
+
+# Marks the start of a pack file
+MAGIC = b'CLPK'
+
+# Bump this whenever the pack layout changes
+VERSION = 1
+
+# The magic is followed by the version and the length of the index
+HEADER = struct.Struct('<4sII')
+
+# How much of a file to copy at a time
+CHUNKSIZE = 1024 * 1024
+
+
+def packFiles(library, directory):
+	"""
+	Lists the files a library is made of, relative to its directory
+	Args:
+		library (ControllerLibrary): the library, after find()
+		directory (str): the library directory
+
+	Returns:
+		list: the sorted relative paths of the files
+
+	"""
+	files = set()
+	for name, info in library.items():
+		for path in (info['path'], info.get('screenshot'), os.path.join(directory, '%s.json' % name)):
+			if path and os.path.exists(path):
+				files.add(os.path.relpath(path, directory).replace(os.sep, '/'))
+	return sorted(files)
+
+
+def exportPack(path, directory=controllerLibrary.DIRECTORY):
+	"""
+	Packs a whole library into a single file: a header, an index of the controllers and
+	where each of their files is, then the files themselves one after another
+	Args:
+		path (str): path of the pack to write
+		directory (str): the library to pack
+
+	"""
+	library = controllerLibrary.ControllerLibrary(roots=[directory])
+	library.find()
+
+	# Work out where every file goes up front, so the index can go before them
+	files = {}
+	offset = 0
+	relativePaths = packFiles(library, directory)
+	for relativePath in relativePaths:
+		stat = os.stat(os.path.join(directory, relativePath))
+		files[relativePath] = [offset, stat.st_size, stat.st_mtime]
+		offset += stat.st_size
+
+	entries = {}
+	for name, info in library.items():
+		info = dict(info)
+		info.pop('root', None)
+		for field in ('path', 'screenshot'):
+			if info.get(field):
+				info[field] = os.path.relpath(info[field], directory).replace(os.sep, '/')
+		entries[name] = info
+
+	fingerprints = dict((name, fingerprint[:3]) for name, fingerprint in library.fingerprints.items())
+	index = json.dumps({'entries': entries, 'fingerprints': fingerprints, 'files': files}, sort_keys=True)
+	index = index.encode('utf-8')
+
+	tempPath = path + '.tmp'
+	with open(tempPath, 'wb') as f:
+		f.write(HEADER.pack(MAGIC, VERSION, len(index)))
+		f.write(index)
+		# Files are copied over a chunk at a time so they never pile up in memory
+		for relativePath in relativePaths:
+			offset, size, mtime = files[relativePath]
+			with open(os.path.join(directory, relativePath), 'rb') as source:
+				written = copyChunks(source, f, size)
+			if written != size:
+				os.remove(tempPath)
+				raise IOError('%s changed while it was being packed' % os.path.join(directory, relativePath))
+
+	if os.path.exists(path):
+		os.remove(path)
+	os.rename(tempPath, path)
+
+
+def copyChunks(source, destination, size):
+	"""
+	Copies part of one file into another, a chunk at a time
+	Args:
+		source (file): the file to copy from
+		destination (file): the file to copy to
+		size (int): how many bytes to copy
+
+	Returns:
+		int: how many bytes were copied
+
+	"""
+	written = 0
+	while written < size:
+		chunk = source.read(min(CHUNKSIZE, size - written))
+		if not chunk:
+			break
+		destination.write(chunk)
+		written += len(chunk)
+	return written
+
+
+def importPack(path, directory=controllerLibrary.DIRECTORY):
+	"""
+	Unpacks a pack into a library directory, replacing controllers with the same names
+	Args:
+		path (str): path of the pack
+		directory (str): the library to unpack into
+
+	"""
+	pack = Pack(path)
+	try:
+		for relativePath in sorted(pack.files):
+			pack.extract(relativePath, os.path.join(directory, relativePath))
+	finally:
+		pack.close()
+
+	# The index remembers the old files, let it rebuild itself
+	index = libraryIndex.LibraryIndex(directory)
+	if os.path.exists(index.path):
+		os.remove(index.path)
+
+
+class Pack(object):
+	"""
+	A memory mapped pack file. Opening it only reads the index,
+	the files in it are only read when they are extracted
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.file = open(path, 'rb')
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		if len(self.map) < HEADER.size or self.map[:4] != MAGIC:
+			self.close()
+			raise IOError('%s is not a controller library pack' % path)
+
+		magic, version, indexLength = HEADER.unpack(self.map[:HEADER.size])
+		if version != VERSION:
+			self.close()
+			raise IOError('%s is a version %d pack, expected version %d' % (path, version, VERSION))
+
+		index = json.loads(self.map[HEADER.size:HEADER.size + indexLength].decode('utf-8'))
+		self.entries = index['entries']
+		self.fingerprints = index['fingerprints']
+		# Relative paths of the files mapped to their [offset, size, mtime]
+		self.files = index['files']
+		# Offsets of the files start after the index
+		self.start = HEADER.size + indexLength
+
+
+	def close(self):
+		"""
+		Releases the pack file
+		"""
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+
+	def read(self, relativePath):
+		"""
+		Reads a file out of the pack
+		Args:
+			relativePath (str): path of the file, relative to the library it was packed from
+
+		Returns:
+			bytes
+
+		"""
+		offset, size, mtime = self.files[relativePath]
+		return self.map[self.start + offset:self.start + offset + size]
+
+
+	def extract(self, relativePath, path):
+		"""
+		Writes a file out of the pack, with the mtime it had when it was packed
+		Args:
+			relativePath (str): path of the file, relative to the library it was packed from
+			path (str): where to write it
+
+		"""
+		offset, size, mtime = self.files[relativePath]
+
+		folder = os.path.dirname(path)
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+
+		with open(path, 'wb') as f:
+			# Slicing the map only pages in this file
+			for chunkOffset in range(0, size, CHUNKSIZE):
+				start = self.start + offset + chunkOffset
+				f.write(self.map[start:start + min(CHUNKSIZE, size - chunkOffset)])
+		os.utime(path, (mtime, mtime))
+
+
+class PackLibrary(controllerLibrary.ControllerLibrary):
+	"""
+	A read-only controller library served straight out of a pack. Screenshots and
+	controllers are written to the local cache the first time they are needed
+	"""
+
+	def __init__(self, path, **kwargs):
+		self.path = os.path.abspath(path)
+		self.pack = None
+		# Pack files are read through the local cache
+		kwargs['roots'] = [self.path]
+		kwargs['cachedRoots'] = [self.path]
+		super(PackLibrary, self).__init__(**kwargs)
+
+
+	def save(self, name, *args, **kwargs):
+		cmds.warning("%s is read only, controllers can't be saved to it" % self.path)
+
+
+	def saveMany(self, controllers, *args, **kwargs):
+		cmds.warning("%s is read only, controllers can't be saved to it" % self.path)
+
+
+	def open(self):
+		"""
+		Opens the pack, or opens it again if it was replaced since we last did
+		Args:
+			self (obj): reference itself
+
+		Returns:
+			bool: whether the pack was (re)opened
+
+		"""
+		stat = os.stat(self.path)
+		stat = [stat.st_mtime, stat.st_size]
+		if self.pack is not None and self.stat == stat:
+			return False
+
+		if self.pack is not None:
+			self.pack.close()
+		self.pack = Pack(self.path)
+		self.stat = stat
+		return True
+
+
+	def iterFind(self, directory=None):
+		"""
+		Find all controllers in the pack, yielding each one as soon as it is read
+		Args:
+			self (obj): reference itself
+			directory (str): ignored, a pack only holds a single library
+
+		Yields:
+			dict: the info of each controller found
+
+		"""
+		# Clear dictionary
+		self.clear()
+		self.fingerprints = {}
+		self.open()
+
+		# Hand controllers back alphabetically so the UI can append them as they come
+		for name in sorted(self.pack.entries):
+			self.fingerprints[name] = self.pack.fingerprints[name] + [self.path]
+			self[name] = self.packInfo(self.pack.entries[name])
+			yield self[name]
+
+
+	def refresh(self, directory=None):
+		"""
+		Updates the library in place if the pack was replaced since it was read
+		Args:
+			self (obj): reference itself
+			directory (str): ignored, a pack only holds a single library
+
+		Returns:
+			tuple: sorted lists of the added, changed and removed controller names
+
+		"""
+		if not self.open():
+			return [], [], []
+
+		fingerprints = dict((name, fingerprint + [self.path])
+							for name, fingerprint in self.pack.fingerprints.items())
+
+		added = sorted(name for name in fingerprints if name not in self)
+		changed = sorted(name for name in fingerprints
+						 if name in self and fingerprints[name] != self.fingerprints.get(name))
+		removed = sorted(name for name in self if name not in fingerprints)
+
+		for name in added + changed:
+			self[name] = self.packInfo(self.pack.entries[name])
+		for name in removed:
+			del self[name]
+
+		self.fingerprints = fingerprints
+		return added, changed, removed
+
+
+	def packInfo(self, info):
+		"""
+		Points the paths of a controller's info into the pack, and its screenshot at our local copy
+		Args:
+			self (obj): reference itself
+			info (dict): the info of the controller, as it is stored in the pack
+
+		Returns:
+			dict
+
+		"""
+		info = dict(info)
+		info['root'] = self.path
+		info['path'] = os.path.join(self.path, info['path'])
+		if info.get('screenshot'):
+			info['screenshot'] = self.fetch(os.path.join(self.path, info['screenshot']))
+		return info
+
+
+	def fetch(self, path):
+		"""
+		Gets a local copy of a file in the pack, only writing it out if ours is missing or outdated
+		Args:
+			self (obj): reference itself
+			path (str): path of the file inside the pack, as the pack's path followed by its relative path
+
+		Returns:
+			str: path of the local copy
+
+		"""
+		relativePath = os.path.relpath(path, self.path).replace(os.sep, '/')
+		offset, size, mtime = self.pack.files[relativePath]
+
+		def extract(path, localPath):
+			self.pack.extract(relativePath, localPath)
+
+		return self.cache.fetch(path, [mtime, size], copy=extract)
+
+
+	def localPath(self, name):
+		"""
+		Gets a path to a controller's maya file that Maya can read, writing it out of the pack as needed
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+
+		Returns:
+			str
+
+		"""
+		return controllerLibrary.localMayaFile(self.fetch(self[name]['path']))
+
+
+if __name__ == '__main__':
+	# mayapy libraryPack.py export|import <pack> [directory]
+	command, packPath = sys.argv[1:3]
+	libraryDirectory = sys.argv[3] if len(sys.argv) > 3 else controllerLibrary.DIRECTORY
+	if command == 'export':
+		exportPack(packPath, libraryDirectory)
+	elif command == 'import':
+		importPack(packPath, libraryDirectory)
+	else:
+		sys.exit('Usage: mayapy libraryPack.py export|import <pack> [directory]')
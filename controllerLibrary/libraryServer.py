@@ -0,0 +1,289 @@
+# Serve a controller library over HTTP, so artists don't all have to mount the directory
+# Run it with mayapy: mayapy libraryServer.py /path/to/library [port]
+try:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+	from urllib.parse import unquote, urlsplit
+except ImportError:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+	from urllib import unquote
+	from urlparse import urlsplit
+# Interact with our OS
+import os
+# Use JSON module to send the index
+import json
+# Name the version of the index we send
+import hashlib
+# Only one request rescans the library at a time
+import threading
+# Don't rescan the library for every request
+import time
+import sys
+import controllerLibrary
+
+# The port the server listens on by default
+PORT = 8765
+
+# How long (in seconds) the index we send is trusted before the library is rescanned
+RESCANINTERVAL = 1.0
+
+# How much of a file to send at a time
+CHUNKSIZE = 1024 * 1024
+
+
+def fileTag(stat):
+	"""
+	Gets the ETag of a file, so clients can check whether their copy is still current
+	Args:
+		stat (list): the [mtime, size] of the file
+
+	Returns:
+		str
+
+	"""
+	return '"%d-%d"' % (int(stat[0] * 1000000), stat[1])
+
+
+def parseRange(header, size):
+	"""
+	Reads a single byte range out of a Range header
+	Args:
+		header (str): the Range header, like 'bytes=100-' or 'bytes=100-199'
+		size (int): size of the file the range is in
+
+	Returns:
+		tuple: the first and last byte of the range, or None if the range can't be served
+
+	"""
+	unit, separator, byteRange = header.partition('=')
+	# We only serve a single range, anything fancier just gets the whole file
+	if unit.strip() != 'bytes' or ',' in byteRange:
+		return None
+
+	first, separator, last = byteRange.strip().partition('-')
+	try:
+		if not first:
+			# 'bytes=-500' is the last 500 bytes
+			first, last = max(size - int(last), 0), size - 1
+		else:
+			first, last = int(first), min(int(last), size - 1) if last else size - 1
+	except ValueError:
+		return None
+
+	if first > last:
+		return None
+	return first, last
+
+
+class LibraryRequestHandler(BaseHTTPRequestHandler):
+	"""
+	Answers requests for the library index (/index) and the files of the library (/files/<path>).
+	Both are sent with an ETag, so clients can ask whether what they have is still current
+	"""
+
+	# Keep connections open between requests
+	protocol_version = 'HTTP/1.1'
+
+
+	def do_GET(self):
+		path = unquote(urlsplit(self.path).path)
+
+		if path == '/index':
+			etag, body = self.server.index()
+			if self.notModified(etag):
+				return
+			self.send_response(200)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(body)))
+			self.send_header('ETag', etag)
+			self.end_headers()
+			self.wfile.write(body)
+			return
+
+		if path.startswith('/files/'):
+			self.sendFile(path[len('/files/'):])
+			return
+
+		self.send_error(404)
+
+
+	def notModified(self, etag):
+		"""
+		Answers a conditional request if the client's copy is still current
+		Args:
+			self (obj): reference itself
+			etag (str): the ETag of what we would send
+
+		Returns:
+			bool: whether the request has been answered
+
+		"""
+		if self.headers.get('If-None-Match') != etag:
+			return False
+
+		self.send_response(304)
+		self.send_header('ETag', etag)
+		self.send_header('Content-Length', '0')
+		self.end_headers()
+		return True
+
+
+	def sendFile(self, relativePath):
+		"""
+		Sends a file of the library, or the part of it that was asked for
+		Args:
+			self (obj): reference itself
+			relativePath (str): path of the file, relative to the library
+
+		"""
+		path = self.server.resolve(relativePath)
+		if not path:
+			self.send_error(404)
+			return
+
+		stat = os.stat(path)
+		size = stat.st_size
+		etag = fileTag([stat.st_mtime, size])
+		if self.notModified(etag):
+			return
+
+		first, last = 0, size - 1
+		byteRange = None
+		# Only send part of the file if the client's partial copy is of this version of it
+		if self.headers.get('Range') and self.headers.get('If-Range', etag) == etag:
+			byteRange = parseRange(self.headers['Range'], size)
+			if byteRange is None:
+				self.send_response(416)
+				self.send_header('Content-Range', 'bytes */%d' % size)
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+				return
+			first, last = byteRange
+
+		length = last - first + 1
+		self.send_response(206 if byteRange else 200)
+		self.send_header('Content-Type', 'application/octet-stream')
+		self.send_header('Content-Length', str(length))
+		self.send_header('ETag', etag)
+		self.send_header('Accept-Ranges', 'bytes')
+		if byteRange:
+			self.send_header('Content-Range', 'bytes %d-%d/%d' % (first, last, size))
+		self.end_headers()
+
+		with open(path, 'rb') as f:
+			f.seek(first)
+			while length > 0:
+				chunk = f.read(min(CHUNKSIZE, length))
+				if not chunk:
+					break
+				self.wfile.write(chunk)
+				length -= len(chunk)
+
+
+class LibraryServer(ThreadingMixIn, HTTPServer):
+	"""
+	Serves a library directory over HTTP, answering every request on its own thread
+	"""
+
+	# Don't keep Maya (or mayapy) open for requests still being answered
+	daemon_threads = True
+
+
+	def __init__(self, directory=controllerLibrary.DIRECTORY, port=PORT):
+		HTTPServer.__init__(self, ('', port), LibraryRequestHandler)
+		self.directory = os.path.realpath(directory)
+		# The index lets the library be listed without reading every JSON file
+		self.library = controllerLibrary.ControllerLibrary(useIndex=True, roots=[self.directory])
+		self.lock = threading.Lock()
+		self.scanned = None
+		self.etag = None
+		self.body = None
+
+
+	def index(self):
+		"""
+		Gets the index of the library to send, rescanning the library if it's been a while
+		Returns:
+			tuple: the ETag and the body of the index
+
+		"""
+		with self.lock:
+			if self.scanned is None:
+				self.library.find()
+				self.body = None
+			elif time.time() - self.scanned > RESCANINTERVAL:
+				if any(self.library.refresh()):
+					self.body = None
+			self.scanned = time.time()
+
+			if self.body is None:
+				self.etag, self.body = self.buildIndex()
+
+			return self.etag, self.body
+
+
+	def buildIndex(self):
+		"""
+		Builds the index we send, with every path made relative to the library
+		Returns:
+			tuple: the ETag and the body of the index
+
+		"""
+		entries = {}
+		stats = {}
+		for name, info in self.library.items():
+			info = dict(info)
+			info.pop('root', None)
+			for field in ('path', 'screenshot'):
+				if info.get(field):
+					stat = os.stat(info[field])
+					info[field] = os.path.relpath(info[field], self.directory).replace(os.sep, '/')
+					# Clients use these to check their local copies without asking us
+					stats[info[field]] = [stat.st_mtime, stat.st_size]
+			entries[name] = info
+
+		fingerprints = dict((name, fingerprint[:3]) for name, fingerprint in self.library.fingerprints.items())
+
+		body = json.dumps({'entries': entries, 'fingerprints': fingerprints, 'stats': stats}, sort_keys=True)
+		body = body.encode('utf-8')
+		return '"%s"' % hashlib.sha1(body).hexdigest(), body
+
+
+	def resolve(self, relativePath):
+		"""
+		Finds a file of the library, making sure the request can't reach outside of it
+		Args:
+			relativePath (str): path of the file, relative to the library
+
+		Returns:
+			str: path of the file, or None if it isn't part of the library
+
+		"""
+		path = os.path.realpath(os.path.join(self.directory, relativePath))
+		if not path.startswith(self.directory + os.sep) or not os.path.isfile(path):
+			return None
+		return path
+
+
+def serve(directory=controllerLibrary.DIRECTORY, port=PORT):
+	"""
+	Serves a library until interrupted
+	Args:
+		directory (str): the library directory
+		port (int): the port to listen on
+
+	"""
+	server = LibraryServer(directory, port)
+	print('Serving %s on port %d' % (directory, port))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+if __name__ == '__main__':
+	serve(sys.argv[1] if len(sys.argv) > 1 else controllerLibrary.DIRECTORY,
+		  int(sys.argv[2]) if len(sys.argv) > 2 else PORT)
@@ -1,9 +1,444 @@
 from maya import cmds
 import pprint
+# Keep the model's names sorted when patching them in
+import bisect
+# Hand changes from the watcher threads over to the UI
+try:
+	from queue import Queue, Empty, Full
+except ImportError:
+	from Queue import Queue, Empty, Full
+# Prefetch controllers on a background thread
+import threading
 import controllerLibrary
 reload(controllerLibrary)
+import libraryClient
+reload(libraryClient)
+import libraryPack
+reload(libraryPack)
+import libraryWatcher
+reload(libraryWatcher)
+# Not reloaded, so decoded thumbnails survive reopening the dialog
+import thumbnailCache
+import thumbnailAtlas
 from Qt import QtWidgets, QtCore, QtGui
 
+# How many controllers to add to the list before letting the UI redraw
+CHUNKSIZE = 50
+
+# How often (in milliseconds) changes the watchers picked up are applied to the list
+WATCHINTERVAL = 200
+
+# What the list can be sorted by: a label, and the statistic to sort by (None sorts by name)
+SORTFIELDS = [('Name', None), ('Node Count', 'nodeCount'), ('CVs', 'cvCount'), ('Vertices', 'vertexCount'),
+			  ('File Size', 'fileSize'), ('Export Time', 'exportTime')]
+
+# How many controllers the background job works out statistics for before saving them
+STATSCHUNKSIZE = 20
+
+# How many hovered or selected controllers can wait to be prefetched, older ones are dropped
+PREFETCHQUEUESIZE = 4
+
+
+def formatStats(stats):
+	"""
+	Describes the statistics of a controller in a line
+	Args:
+		stats (dict): the statistics
+
+	Returns:
+		str
+
+	"""
+	parts = []
+	for label, field in SORTFIELDS:
+		if field and stats.get(field) is not None:
+			parts.append('%s: %s' % (label, stats[field]))
+	return ', '.join(parts)
+
+
+class ControllerListModel(QtCore.QAbstractListModel):
+	"""
+	A list model of the controllers in a library. The view only asks for the rows it is drawing,
+	so names, thumbnails and tooltips are only looked up for visible controllers
+
+	"""
+
+	def __init__(self, library, thumbnails, atlas=None, parent=None):
+		super(ControllerListModel, self).__init__(parent)
+		self.library = library
+		self.thumbnails = thumbnails
+		# Pre-scaled thumbnails are read from the atlas when it has them
+		self.atlas = atlas
+		self.thumbnails.thumbnailReady.connect(self.thumbnailReady)
+		# Sorted names of the controllers, one per row
+		self.names = []
+		# The statistic rows are sorted by, or None to sort them by name
+		self.sortField = None
+		# The sort key of each row, kept alongside the names so rows can be found and inserted with bisect
+		self.keys = []
+		# Names mapped to the key they were sorted with, since their statistics can change under us
+		self.rowKeys = {}
+		# Names of the controllers matching the current search, or None to show all of them
+		self.filter = None
+		# Screenshot paths mapped to the name of the row waiting on them
+		self.waiting = {}
+
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		# A list has no children
+		if parent.isValid():
+			return 0
+		return len(self.names)
+
+
+	def data(self, index, role=QtCore.Qt.DisplayRole):
+		"""
+		Looks up what the view needs to draw a row, only when it asks for it
+		Args:
+			index (QModelIndex): the row to look up
+			role (int): what is being asked for
+
+		"""
+		if not index.isValid():
+			return None
+
+		name = self.names[index.row()]
+
+		if role == QtCore.Qt.DisplayRole:
+			return name
+
+		if role == QtCore.Qt.DecorationRole:
+			return self.icon(name)
+
+		if role == QtCore.Qt.ToolTipRole:
+			info = dict(self.library[name])
+			# Lead with how heavy the controller is, so there's no need to import it to find out
+			if info.get('stats'):
+				return '%s\n%s' % (formatStats(info['stats']), pprint.pformat(info))
+			return pprint.pformat(info)
+
+		return None
+
+
+	def icon(self, name):
+		"""
+		Gets the thumbnail of a controller, or a placeholder while it is being decoded
+		Args:
+			name (str): name of the controller
+
+		Returns:
+			QIcon
+
+		"""
+		screenshot = self.library[name].get('screenshot')
+		if not screenshot:
+			return None
+
+		# Pass the screenshot's mtime along so a changed screenshot gets decoded again
+		fingerprint = self.library.fingerprints.get(name)
+		source = fingerprint[2] if fingerprint else None
+		mtime = source[0] if source else None
+
+		data = None
+		if self.atlas:
+			data = self.atlas.get(name, self.thumbnails.size, source)
+
+		pixmap = self.thumbnails.get(screenshot, mtime, data)
+		if pixmap is None:
+			self.waiting[screenshot] = name
+			pixmap = self.thumbnails.placeholder
+
+		return QtGui.QIcon(pixmap)
+
+
+	def row(self, name):
+		"""
+		Finds the row of a controller
+		Args:
+			name (str): name of the controller
+
+		Returns:
+			int: the row, or -1 if it isn't in the model
+
+		"""
+		key = self.rowKeys.get(name)
+		if key is None:
+			return -1
+
+		row = bisect.bisect_left(self.keys, key)
+		if row < len(self.names) and self.names[row] == name:
+			return row
+		return -1
+
+
+	def sortKey(self, name):
+		"""
+		Gets what a controller is sorted by: its name, or the statistic being sorted by, largest first
+		Args:
+			name (str): name of the controller
+
+		Returns:
+			str or tuple
+
+		"""
+		if self.sortField is None:
+			return name
+
+		value = (self.library[name].get('stats') or {}).get(self.sortField)
+		# Controllers without the statistic go last, ties are broken by name
+		return (value is None, -(value or 0), name)
+
+
+	def setSortField(self, field):
+		"""
+		Sorts the rows by a statistic
+		Args:
+			field (str): the statistic to sort by, or None to sort by name
+
+		"""
+		self.sortField = field
+		self.setFilter(self.filter)
+
+
+	def clear(self):
+		"""
+		Removes every row
+		"""
+		self.beginResetModel()
+		self.names = []
+		self.keys = []
+		self.rowKeys = {}
+		self.filter = None
+		self.waiting = {}
+		self.endResetModel()
+
+
+	def setFilter(self, names):
+		"""
+		Only shows the given controllers
+		Args:
+			names (set): names of the controllers to show, or None to show all of them
+
+		"""
+		self.beginResetModel()
+		self.filter = names
+		self.rowKeys = dict((name, self.sortKey(name)) for name in (self.library if names is None else names))
+		self.names = sorted(self.rowKeys, key=self.rowKeys.get)
+		self.keys = [self.rowKeys[name] for name in self.names]
+		self.endResetModel()
+
+
+	def addName(self, name):
+		"""
+		Adds a row for a controller where it belongs in the sort order, or redraws it if it is already there
+		Args:
+			name (str): name of the controller
+
+		"""
+		key = self.sortKey(name)
+		if self.row(name) != -1:
+			if self.rowKeys[name] == key:
+				self.nameChanged(name)
+				return
+			# Its statistics changed, so it moves to a new row
+			self.removeName(name)
+
+		# Hidden by the current search
+		if self.filter is not None and name not in self.filter:
+			return
+
+		row = bisect.bisect(self.keys, key)
+		self.beginInsertRows(QtCore.QModelIndex(), row, row)
+		self.names.insert(row, name)
+		self.keys.insert(row, key)
+		self.rowKeys[name] = key
+		self.endInsertRows()
+
+
+	def removeName(self, name):
+		"""
+		Removes the row of a controller
+		Args:
+			name (str): name of the controller
+
+		"""
+		row = self.row(name)
+		if row == -1:
+			return
+
+		self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+		del self.names[row]
+		del self.keys[row]
+		del self.rowKeys[name]
+		self.endRemoveRows()
+
+
+	def nameChanged(self, name):
+		"""
+		Tells the view to redraw the row of a controller
+		Args:
+			name (str): name of the controller
+
+		"""
+		row = self.row(name)
+		if row != -1:
+			index = self.index(row)
+			self.dataChanged.emit(index, index)
+
+
+	def thumbnailReady(self, path):
+		"""
+		Redraws the row that was waiting on a thumbnail once it has been decoded
+		Args:
+			path (str): path of the screenshot that was decoded
+
+		"""
+		name = self.waiting.pop(path, None)
+		if name is not None:
+			self.nameChanged(name)
+
+
+class StatsSignals(QtCore.QObject):
+	"""
+	QRunnable isn't a QObject, so its signals have to live on a separate object
+	"""
+	read = QtCore.Signal(object)
+	finished = QtCore.Signal()
+
+
+class StatsTask(QtCore.QRunnable):
+	"""
+	Works out the statistics of controllers saved before they were recorded, on a background thread.
+	They are handed back a chunk at a time, for the UI to save
+	"""
+
+	def __init__(self, library, names):
+		super(StatsTask, self).__init__()
+		self.library = library
+		self.names = names
+		self.signals = StatsSignals()
+
+
+	def run(self):
+		stats = {}
+		for name in self.names:
+			try:
+				stats[name] = self.library.readStats(name)
+			except (IOError, OSError, KeyError, ValueError):
+				# Removed or unreadable, we'll try again next time the list is refreshed
+				continue
+
+			# Signals are queued back to the GUI thread
+			if len(stats) >= STATSCHUNKSIZE:
+				self.signals.read.emit(stats)
+				stats = {}
+
+		if stats:
+			self.signals.read.emit(stats)
+		self.signals.finished.emit()
+
+class SearchIndexTask(QtCore.QRunnable):
+	"""
+	Indexes the library for searching on a background thread, so the first search doesn't have to
+	"""
+
+	def __init__(self, library):
+		super(SearchIndexTask, self).__init__()
+		self.library = library
+
+
+	def run(self):
+		self.library.searchIndex.build()
+
+
+class Prefetcher(object):
+	"""
+	Gets the controllers the user hovers or selects ready to import on a background thread, so importing
+	reads them from the local cache instead of the network. Only the last few requests are kept,
+	so scrolling past a page of controllers doesn't queue up a download for each of them
+
+	"""
+
+	def __init__(self, library, size=PREFETCHQUEUESIZE):
+		self.library = library
+		self.queue = Queue(size)
+		# Names of the controllers already prefetched, mapped to the fingerprint they had then
+		self.fetched = {}
+		self.thread = threading.Thread(target=self.run)
+		# Don't keep Maya open just for us
+		self.thread.daemon = True
+		self.thread.start()
+
+
+	def request(self, name):
+		"""
+		Asks for a controller to be prefetched, dropping the oldest request if too many are waiting
+		Args:
+			name (str): name of the controller
+
+		"""
+		if self.isFetched(name):
+			return
+
+		while True:
+			try:
+				self.queue.put_nowait(name)
+				return
+			except Full:
+				# The user has moved on from the oldest request
+				try:
+					self.queue.get_nowait()
+				except Empty:
+					pass
+
+
+	def isFetched(self, name):
+		"""
+		Checks whether a controller was prefetched since its files last changed
+		Args:
+			name (str): name of the controller
+
+		Returns:
+			bool
+
+		"""
+		fingerprint = self.library.fingerprints.get(name)
+		return fingerprint is not None and self.fetched.get(name) == fingerprint
+
+
+	def run(self):
+		while True:
+			name = self.queue.get()
+			# Asked to stop
+			if name is None:
+				return
+			if self.isFetched(name) or name not in self.library:
+				continue
+
+			fingerprint = self.library.fingerprints.get(name)
+			try:
+				self.library.prefetch(name)
+			except Exception:
+				# Prefetching is only a head start, importing will report whatever went wrong
+				continue
+			self.fetched[name] = fingerprint
+
+
+	def stop(self):
+		"""
+		Drops any waiting requests and waits for the one being prefetched to finish. Safe to call more than once
+		"""
+		if not self.thread.is_alive():
+			return
+
+		while True:
+			try:
+				self.queue.get_nowait()
+			except Empty:
+				break
+		self.queue.put(None)
+		self.thread.join()
+
 # LIBRARY UI CLASS
 class ControllerLibraryUI (QtWidgets.QDialog):
 	"""
@@ -22,12 +457,43 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 		self.setWindowTitle('Controller Library UI ')
 		
 		# Create instance of our controller library in out UI
-		self.library = controllerLibrary.ControllerLibrary()
+		# Use the on-disk index so big libraries list quickly
+		# Layer any show and studio libraries under ours, reading them through a local cache
+		# Or browse a library server or a pack instead, if one is set up
+		if libraryClient.SERVER:
+			self.library = libraryClient.RemoteLibrary(libraryClient.SERVER)
+		elif libraryPack.PACK:
+			self.library = libraryPack.PackLibrary(libraryPack.PACK)
+		else:
+			self.library = controllerLibrary.ControllerLibrary(useIndex=True, roots=controllerLibrary.ROOTS,
+															   cachedRoots=controllerLibrary.ROOTS[1:],
+															   workers=controllerLibrary.WORKERS)
+
+		# Pre-scaled thumbnails of the whole library, packed in one file
+		self.atlas = thumbnailAtlas.ThumbnailAtlas(controllerLibrary.DIRECTORY)
+		self.buildingAtlas = False
+		# Statistics of older controllers are worked out in the background, one job at a time
+		self.computingStats = False
+
+		# Hovered and selected controllers are copied into the local cache in the background, ready to import
+		self.prefetcher = Prefetcher(self.library)
+
+		# Thumbnails are decoded in the background, rows show a placeholder until theirs is ready
+		self.model = ControllerListModel(self.library, thumbnailCache.getCache(), self.atlas, self)
 		
 		# Everytime new instance is created, automatically build UI and populate it
 		self.buildUI()
 		self.populate()
 
+		# Pick up controllers saved (by us or anyone else) while we're open, without rescanning everything
+		# The watchers run on their own threads, so what they find is queued up for a timer to apply
+		self.watched = Queue()
+		self.watchers = libraryWatcher.startWatchers(self.library, self.watched.put)
+		self.watchTimer = QtCore.QTimer(self)
+		self.watchTimer.setInterval(WATCHINTERVAL)
+		self.watchTimer.timeout.connect(self.applyWatched)
+		self.watchTimer.start()
+
 
 
 	def buildUI(self):
@@ -54,6 +520,28 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 		saveBtn = QtWidgets.QPushButton('Save')
 		saveBtn.clicked.connect(self.save)
 		saveLayout.addWidget(saveBtn)
+		# Save Each Button - saves every selected node as its own controller
+		saveManyBtn = QtWidgets.QPushButton('Save Each')
+		saveManyBtn.setToolTip('Save each selected node as its own controller, using the name as a prefix')
+		saveManyBtn.clicked.connect(self.saveMany)
+		saveLayout.addWidget(saveManyBtn)
+
+
+		# *** SEARCH FIELD  ***
+		# Filters the list down to the controllers whose name or info match
+		self.searchField = QtWidgets.QLineEdit()
+		self.searchField.setPlaceholderText('Search (use field:value to search one info field)')
+		self.searchField.textChanged.connect(self.search)
+		# Sort Box - sorts by name, or by how heavy controllers are
+		self.sortBox = QtWidgets.QComboBox()
+		for label, field in SORTFIELDS:
+			self.sortBox.addItem(label, field)
+		self.sortBox.currentIndexChanged.connect(self.sort)
+		searchWidget = QtWidgets.QWidget()
+		searchLayout = QtWidgets.QHBoxLayout(searchWidget)
+		searchLayout.addWidget(self.searchField)
+		searchLayout.addWidget(self.sortBox)
+		layout.addWidget(searchWidget)
 
 
 		# *** THUMBNAIL LIST WIDGET  ***
@@ -61,14 +549,23 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 		size = 64
 		buffer = 12
 		# Displays an area where controllers can be displayed
-		self.listWidget = QtWidgets.QListWidget()
-		# List Widget should display items in icon mode instead
-		self.listWidget.setViewMode(QtWidgets.QListWidget.IconMode)
-		self.listWidget.setIconSize(QtCore.QSize(size, size))
-		# List Widget shoudl readjust content based on window size
-		self.listWidget.setResizeMode(QtWidgets.QListWidget.Adjust)
-		self.listWidget.setGridSize(QtCore.QSize(size+buffer, size+buffer))
-		layout.addWidget(self.listWidget)
+		self.listView = QtWidgets.QListView()
+		self.listView.setModel(self.model)
+		# List View should display items in icon mode instead
+		self.listView.setViewMode(QtWidgets.QListView.IconMode)
+		self.listView.setIconSize(QtCore.QSize(size, size))
+		# List View shoudl readjust content based on window size
+		self.listView.setResizeMode(QtWidgets.QListView.Adjust)
+		self.listView.setGridSize(QtCore.QSize(size+buffer, size+buffer))
+		# Every item is the same size, so the view doesn't have to measure each one
+		self.listView.setUniformItemSizes(True)
+		# Allow importing many controllers at once
+		self.listView.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+		# Get controllers ready to import as soon as the user shows interest in them
+		self.listView.setMouseTracking(True)
+		self.listView.entered.connect(self.prefetch)
+		self.listView.selectionModel().currentChanged.connect(self.prefetch)
+		layout.addWidget(self.listView)
 
 		# *** BUTTONS  ***
 		# Create sub-horizontal layout for buttons
@@ -79,9 +576,22 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 		importBtn = QtWidgets.QPushButton('Import!')
 		importBtn.clicked.connect(self.load)
 		btnLayout.addWidget(importBtn)
+		# ------- Reuse Checkbox
+		self.reuseCheckBox = QtWidgets.QCheckBox('Reuse Imports')
+		self.reuseCheckBox.setToolTip('Keep a hidden copy of each imported controller and duplicate it next time')
+		btnLayout.addWidget(self.reuseCheckBox)
+		# ------- Reference Checkbox
+		self.referenceCheckBox = QtWidgets.QCheckBox('As Reference')
+		self.referenceCheckBox.setToolTip('Reference heavy controllers instead of copying them into the scene')
+		btnLayout.addWidget(self.referenceCheckBox)
+		# ------- Import References Btn
+		importReferencesBtn = QtWidgets.QPushButton('Make Real')
+		importReferencesBtn.setToolTip('Import the references of the selected controllers into the scene')
+		importReferencesBtn.clicked.connect(self.importReferences)
+		btnLayout.addWidget(importReferencesBtn)
 		# -------Refresh Btn
 		refreshBtn = QtWidgets.QPushButton('Refresh')
-		refreshBtn.clicked.connect(self.populate)
+		refreshBtn.clicked.connect(self.refresh)
 		btnLayout.addWidget(refreshBtn)
 		# -------Close Btn
 		closeBtn = QtWidgets.QPushButton('Close')
@@ -94,27 +604,260 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 
 	def populate(self):
 		"""
-		Clears list widget and populates it with controllers
+		Clears list view and populates it with controllers
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		self.model.clear()
+
+		# Read the library a chunk at a time so the first icons show up straight away
+		self.finder = self.library.iterFind()
+		self.populateChunk()
+
+
+	def populateChunk(self):
+		"""
+		Adds the next chunk of controllers found to the list view and schedules the one after it
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		# Population was finished or cancelled by a refresh
+		if self.finder is None:
+			return
+
+		for i in range(CHUNKSIZE):
+			info = next(self.finder, None)
+			if info is None:
+				self.finder = None
+				self.updateSearchIndex()
+				self.updateAtlas()
+				self.updateStats()
+				return
+
+			self.model.addName(info['name'])
+
+		# Let Qt draw what we have so far before reading more
+		QtCore.QTimer.singleShot(0, self.populateChunk)
+
+
+	def refresh(self):
+		"""
+		Patches the list view with the controllers that were added, changed or removed since the last look
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		# Stop any population still in progress, refreshing picks up whatever it hadn't read yet
+		self.finder = None
+
+		self.applyChanges(*self.library.refresh())
+
+
+	def applyWatched(self):
+		"""
+		Patches the list view with the controllers the watchers saw change
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		# Leave changes queued until population is done, it may not have reached them yet
+		if self.finder is not None:
+			return
+
+		names = set()
+		rescan = False
+		while True:
+			try:
+				changed = self.watched.get_nowait()
+			except Empty:
+				break
+			# A watcher lost track of what changed
+			if changed is None:
+				rescan = True
+			else:
+				names.update(changed)
+
+		if rescan:
+			self.refresh()
+		elif names:
+			self.applyChanges(*self.library.refreshNames(names))
+
+
+	def applyChanges(self, added, changed, removed):
+		"""
+		Patches the list view with controllers that were added, changed or removed
+		
+		Args:
+			self (obj): reference itself
+			added (list): names of the controllers that were added
+			changed (list): names of the controllers that changed
+			removed (list): names of the controllers that were removed
+
+		"""
+		if not (added or changed or removed):
+			return
+
+		for name in removed:
+			self.model.removeName(name)
+
+		for name in added + changed:
+			self.model.addName(name)
+
+		# Changed controllers may now match the search, or no longer match it
+		if self.searchField.text().strip():
+			self.search()
+		else:
+			self.updateSearchIndex()
+
+		self.updateAtlas()
+		self.updateStats()
+
+
+	def search(self):
+		"""
+		Filters the list view down to the controllers matching the search field
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		query = self.searchField.text()
+		if not query.strip():
+			self.model.setFilter(None)
+			return
+
+		self.model.setFilter(self.library.search(query))
+
+
+	def sort(self):
+		"""
+		Sorts the list view by what is picked in the sort box
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		self.model.setSortField(SORTFIELDS[self.sortBox.currentIndex()][1])
+
+
+	def updateStats(self):
+		"""
+		Works out the statistics of controllers saved before they were recorded, in the background
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		# Only one job at a time, the next refresh will catch anything this one misses
+		if self.computingStats:
+			return
+
+		names = self.library.missingStats()
+		if not names:
+			return
+
+		self.computingStats = True
+		task = StatsTask(self.library, names)
+		task.signals.read.connect(self.statsRead)
+		task.signals.finished.connect(self.statsFinished)
+		QtCore.QThreadPool.globalInstance().start(task)
+
+
+	def statsRead(self, stats):
+		"""
+		Saves statistics worked out in the background, and re-sorts the controllers they belong to
+		
+		Args:
+			self (obj): reference itself
+			stats (dict): names of the controllers mapped to their statistics
+
+		"""
+		# Some may have been removed since the job started
+		stats = dict((name, controllerStats) for name, controllerStats in stats.items() if name in self.library)
+		self.applyChanges(*self.library.saveStats(stats))
+
+
+	def statsFinished(self):
+		"""
+		Lets the next refresh start another statistics job
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		self.computingStats = False
+
+
+	def updateSearchIndex(self):
+		"""
+		Indexes controllers that were added or changed for searching, in the background
 		
 		Args:
 			self (obj): reference itself
 
 		"""
-		self.listWidget.clear()
-		self.library.find()
+		if self.library.searchIndex.pending:
+			QtCore.QThreadPool.globalInstance().start(SearchIndexTask(self.library))
 
 
-		for name, info in sorted(self.library.items()):
-			# Create item text for our list widget 
-			item = QtWidgets.QListWidgetItem(name)
-			self.listWidget.addItem(item)
-			# Attach screenshot to each
-			screenshot = info.get('screenshot')
-			if screenshot:
-				icon = QtGui.QIcon(screenshot)
-				item.setIcon(icon)
+	def updateAtlas(self):
+		"""
+		Rebuilds the thumbnail atlas in the background if any screenshots were added, changed or removed
+		
+		Args:
+			self (obj): reference itself
 
-			item.setToolTip(pprint.pformat(info))
+		"""
+		# Only one build at a time, the next refresh will catch anything this one misses
+		if self.buildingAtlas:
+			return
+
+		screenshots = {}
+		for name, info in self.library.items():
+			fingerprint = self.library.fingerprints.get(name)
+			if info.get('screenshot') and fingerprint and fingerprint[2]:
+				screenshots[name] = (info['screenshot'], fingerprint[2])
+
+		if not screenshots or not self.atlas.isStale(screenshots):
+			return
+
+		self.buildingAtlas = True
+		task = thumbnailAtlas.BuildTask(self.atlas, screenshots)
+		task.signals.built.connect(self.atlasBuilt)
+		QtCore.QThreadPool.globalInstance().start(task)
+
+
+	def atlasBuilt(self, path):
+		"""
+		Starts using a thumbnail atlas that was built in the background
+		
+		Args:
+			self (obj): reference itself
+			path (str): path of the new atlas
+
+		"""
+		self.buildingAtlas = False
+		self.atlas.replace(path)
+
+
+	def prefetch(self, index, previous=None):
+		"""
+		Starts getting a hovered or selected controller ready to import in the background
+		
+		Args:
+			self (obj): reference itself
+			index (QModelIndex): the row of the controller
+			previous (QModelIndex): the row that was current before, when the selection moved
+
+		"""
+		if index.isValid():
+			self.prefetcher.request(index.data())
 
 
 	def load(self):
@@ -125,14 +868,27 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 			self (obj): reference itself
 
 		"""
-		# Gives us current selected intem in out listWidget
-		currentItem = self.listWidget.currentItem()
+		# Gives us the selected items in our listView
+		names = sorted(index.data() for index in self.listView.selectionModel().selectedIndexes())
 
-		if not currentItem:
+		if not names:
 			return
 
-		name = currentItem.text()
-		self.library.load(name)
+		# Import them all as one undo
+		self.library.loadMany(names, useCache=self.reuseCheckBox.isChecked(),
+							  reference=self.referenceCheckBox.isChecked())
+
+
+	def importReferences(self):
+		"""
+		Import the references of all controllers we have selected
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		for index in self.listView.selectionModel().selectedIndexes():
+			self.library.importReferences(index.data())
 
 
 	def save(self):
@@ -150,16 +906,76 @@ class ControllerLibraryUI (QtWidgets.QDialog):
 			cmds.warning("You must give a name!")
 			return
 
-		# Save the model with its name
-		self.library.save(name)
-		# Refresh list view
-		self.populate()
+		# Save the model with its name, only exporting the selection so the scene is never renamed
+		self.library.save(name, exportOnly=True)
+		# Refresh list view, only patching in what changed
+		self.refresh()
+		# Reset text field
+		self.saveNameField.setText('')
+
+
+	def saveMany(self):
+		"""
+		Save each selected node as its own controller, named after the node with the given name as a prefix
+		
+		Args:
+			self (obj): reference itself
+
+		"""
+		# Only transforms, each one is exported along with everything under it
+		nodes = cmds.ls(selection=True, transforms=True)
+		if not nodes:
+			cmds.warning("You must select the controllers to save!")
+			return
+
+		prefix = self.saveNameField.text().strip()
+		# Name each controller after its node, without any namespace or parent path
+		controllers = {}
+		for node in nodes:
+			controllers.setdefault(prefix + node.split('|')[-1].split(':')[-1], []).append(node)
+
+		# Nodes with the same short name would be saved over each other
+		clashes = sorted(name for name, names in controllers.items() if len(names) > 1)
+		if clashes:
+			cmds.warning("Several selected nodes would be saved as %s, rename them first" % ', '.join(clashes))
+			return
+
+		self.library.saveMany(controllers)
+		# Refresh list view, only patching in what changed
+		self.refresh()
 		# Reset text field
 		self.saveNameField.setText('')
 
 
 
 
+	def teardown(self):
+		"""
+		Stops watching and prefetching the library once nobody is looking. Safe to call more than once
+		Args:
+			self (obj): reference itself
+
+		"""
+		self.watchTimer.stop()
+		for watcher in self.watchers:
+			watcher.stop()
+		self.watchers = []
+		self.prefetcher.stop()
+
+
+	def done(self, result):
+		# Esc only hides the dialog, without a closeEvent
+		self.teardown()
+		super(ControllerLibraryUI, self).done(result)
+
+
+	def closeEvent(self, event):
+		self.teardown()
+		super(ControllerLibraryUI, self).closeEvent(event)
+
+
+
+
 def showUI():
 	"""
 	Displays our UI Window and returns handle to UI
@@ -0,0 +1,310 @@
+# Interact with our OS
+import os
+# Call inotify straight out of the C library, there's no module for it in the standard library
+import ctypes
+import ctypes.util
+# Wait on inotify with a timeout
+import select
+# Unpack inotify events
+import struct
+# Watch on a background thread
+import threading
+import time
+import sys
+import controllerLibrary
+
+# How long (in seconds) a library has to be quiet before we report what changed,
+# so a save writing three files is reported once
+DEBOUNCE = 0.25
+
+# How often (in seconds) libraries are listed when they can't be watched with inotify
+POLLINTERVAL = 1.0
+
+# The inotify events we care about: files finished writing, created, deleted or moved in and out
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCHMASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# Each inotify event starts with the watch, mask, cookie and the length of the file name after it
+EVENT = struct.Struct('iIII')
+
+
+def controllerName(filename):
+	"""
+	Gets the name of the controller a file belongs to
+	Args:
+		filename (str): name of the file
+
+	Returns:
+		str: the name of the controller, or None if the file isn't part of one
+
+	"""
+	for extension in controllerLibrary.MAYAEXTENSIONS + controllerLibrary.EXTENSIONS:
+		if filename.endswith(extension):
+			return filename[:-len(extension)]
+	return None
+
+
+def loadInotify():
+	"""
+	Loads the C library's inotify functions
+	Returns:
+		ctypes.CDLL: the C library, or None if inotify isn't available
+
+	"""
+	if not sys.platform.startswith('linux'):
+		return None
+
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		libc.inotify_init
+		libc.inotify_add_watch
+	except (OSError, AttributeError):
+		return None
+
+	libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+	return libc
+
+
+class Watcher(object):
+	"""
+	Watches library directories on a background thread and reports which controllers changed.
+	Changes are collected until the libraries have been quiet for a moment, then the callback
+	is called (on the watcher's thread) with the names of the controllers whose files changed,
+	or None if it lost track and everything should be looked at again
+
+	"""
+
+	def __init__(self, directories, callback, debounce=DEBOUNCE):
+		# Only directories can be watched, so remote and pack libraries are left out
+		self.directories = [directory for directory in directories if os.path.isdir(directory)]
+		self.callback = callback
+		self.debounce = debounce
+		self.stopped = threading.Event()
+		self.thread = None
+
+
+	def start(self):
+		"""
+		Starts watching
+		"""
+		self.setup()
+		self.thread = threading.Thread(target=self.run)
+		# Don't keep Maya open just for us
+		self.thread.daemon = True
+		self.thread.start()
+
+
+	def stop(self):
+		"""
+		Stops watching, waiting for the watcher's thread to finish
+		"""
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+		self.teardown()
+
+
+	def run(self):
+		# Names of the controllers that changed since we last reported
+		pending = set()
+		rescan = False
+		lastChange = None
+
+		while not self.stopped.is_set():
+			# Wake up often enough to report changes once things go quiet
+			names = self.wait(self.debounce / 2.0)
+			if names is None:
+				rescan = True
+				lastChange = time.time()
+			elif names:
+				pending.update(names)
+				lastChange = time.time()
+
+			if lastChange is not None and time.time() - lastChange >= self.debounce:
+				self.callback(None if rescan else pending)
+				pending = set()
+				rescan = False
+				lastChange = None
+
+
+	def setup(self):
+		"""
+		Gets ready to watch, before the watcher's thread starts
+		"""
+		pass
+
+
+	def teardown(self):
+		"""
+		Cleans up once the watcher's thread has stopped
+		"""
+		pass
+
+
+	def wait(self, timeout):
+		"""
+		Waits for changes
+		Args:
+			timeout (float): how long to wait at most
+
+		Returns:
+			set: names of the controllers that changed (empty if nothing did), or None if we lost track
+
+		"""
+		raise NotImplementedError
+
+
+class InotifyWatcher(Watcher):
+	"""
+	Watches libraries with Linux's inotify, so changes are reported without listing anything.
+	inotify only sees changes made by this machine, so libraries other machines save to over NFS need polling
+	"""
+
+	def __init__(self, directories, callback, debounce=DEBOUNCE, libc=None):
+		super(InotifyWatcher, self).__init__(directories, callback, debounce)
+		self.libc = libc or loadInotify()
+		self.fd = None
+
+
+	def setup(self):
+		self.fd = self.libc.inotify_init()
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), 'Could not start inotify')
+
+		for directory in self.directories:
+			if self.libc.inotify_add_watch(self.fd, directory.encode(sys.getfilesystemencoding()), WATCHMASK) < 0:
+				raise OSError(ctypes.get_errno(), 'Could not watch %s' % directory)
+
+
+	def teardown(self):
+		if self.fd is not None:
+			# Closing the descriptor removes all of its watches
+			os.close(self.fd)
+			self.fd = None
+
+
+	def wait(self, timeout):
+		readable, writable, failed = select.select([self.fd], [], [], timeout)
+		if not readable:
+			return set()
+
+		data = os.read(self.fd, 64 * 1024)
+		names = set()
+		offset = 0
+		while offset < len(data):
+			watch, mask, cookie, length = EVENT.unpack_from(data, offset)
+			offset += EVENT.size
+			filename = data[offset:offset + length].rstrip(b'\0').decode(sys.getfilesystemencoding())
+			offset += length
+
+			# The kernel dropped events, so we can't know what changed
+			if mask & IN_Q_OVERFLOW:
+				return None
+
+			name = controllerName(filename)
+			if name:
+				names.add(name)
+
+		return names
+
+
+class PollingWatcher(Watcher):
+	"""
+	Watches libraries by listing them every so often and comparing the (mtime, size) of every file.
+	Works everywhere, including libraries other machines save to over NFS
+	"""
+
+	def __init__(self, directories, callback, debounce=DEBOUNCE, interval=POLLINTERVAL):
+		super(PollingWatcher, self).__init__(directories, callback, debounce)
+		self.interval = interval
+		self.snapshots = {}
+		self.lastPoll = 0
+
+
+	def setup(self):
+		self.snapshots = dict((directory, self.snapshot(directory)) for directory in self.directories)
+		self.lastPoll = time.time()
+
+
+	def snapshot(self, directory):
+		"""
+		Takes the (mtime, size) of every controller file in a directory
+		Args:
+			directory (str): the directory
+
+		Returns:
+			dict: names of the files mapped to their [mtime, size]
+
+		"""
+		if not os.path.isdir(directory):
+			return {}
+
+		files = controllerLibrary.listDirectory(directory)
+		return dict((filename, controllerLibrary.fileStat(filename, directory, files))
+					for filename in files if controllerName(filename))
+
+
+	def wait(self, timeout):
+		# Sleep until the next poll, but no longer than we were asked to
+		if self.stopped.wait(max(0, min(timeout, self.lastPoll + self.interval - time.time()))):
+			return set()
+		if time.time() - self.lastPoll < self.interval:
+			return set()
+		self.lastPoll = time.time()
+
+		names = set()
+		for directory in self.directories:
+			snapshot = self.snapshot(directory)
+			previous = self.snapshots[directory]
+			for filename in set(snapshot).union(previous):
+				if snapshot.get(filename) != previous.get(filename):
+					names.add(controllerName(filename))
+			self.snapshots[directory] = snapshot
+
+		return names
+
+
+def startWatchers(library, callback, debounce=DEBOUNCE):
+	"""
+	Starts watching the directories of a library. Local directories are watched with inotify where it's
+	available, network ones (the library's cached roots) are polled, since inotify can't see other machines' saves
+	Args:
+		library (ControllerLibrary): the library to watch
+		callback (function): called on the watchers' threads with the names of the controllers that changed,
+			or None if everything should be looked at again
+		debounce (float): how long the directories have to be quiet before changes are reported
+
+	Returns:
+		list: the watchers that were started
+
+	"""
+	directories = [root for root in library.roots if os.path.isdir(root)]
+	local = [directory for directory in directories if directory not in library.cachedRoots]
+	remote = [directory for directory in directories if directory in library.cachedRoots]
+
+	watchers = []
+	libc = loadInotify()
+	if local and libc is not None:
+		watcher = InotifyWatcher(local, callback, debounce, libc)
+		try:
+			watcher.start()
+			watchers.append(watcher)
+			local = []
+		except OSError:
+			# Out of watches, or the filesystem doesn't support them
+			watcher.teardown()
+
+	if local + remote:
+		watcher = PollingWatcher(local + remote, callback, debounce)
+		watcher.start()
+		watchers.append(watcher)
+
+	return watchers
@@ -0,0 +1,300 @@
+# Split text up into words
+import re
+# Look up every word starting with a prefix in a sorted list
+import bisect
+# The index can be built on a background thread while the library keeps changing
+import threading
+# Turn info values that aren't text into text we can split up
+import json
+
+try:
+	# Python 2 info is read from JSON as unicode, which str() can't always turn into bytes
+	TEXTTYPES = basestring
+except NameError:
+	TEXTTYPES = str
+
+# Info fields that are no use to search through
+SKIPFIELDS = ('path', 'screenshot', 'root', 'stats')
+
+# Once a query has narrowed the results down this far, the rest of its words are checked against those results directly
+NARROWED = 1000
+
+# How many prefixes to remember the matches of, short prefixes match most of a big library and are slow to gather
+PREFIXCACHESIZE = 256
+
+# How many controllers to add to the index at a time, so changes to the library never wait long on a build
+BUILDCHUNKSIZE = 1000
+
+
+def tokenize(text):
+	"""
+	Splits text up into lower case words. camelCase words are also split into their parts,
+	so 'armCtrl' can be found by 'arm', 'ctrl' or 'armctrl'
+	Args:
+		text (str): the text to split
+
+	Returns:
+		list
+
+	"""
+	words = []
+	for word in re.findall(r'[A-Za-z0-9]+', text):
+		words.append(word.lower())
+		parts = re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+', word)
+		if len(parts) > 1:
+			words.extend(part.lower() for part in parts)
+	return words
+
+
+class SearchIndex(object):
+	"""
+	An in-memory inverted index over the names and info of controllers.
+	Each word maps to the names of the controllers it appears in, and the words are kept sorted
+	so every word starting with a prefix can be found with a binary search.
+	Controllers are only queued up as they are added; build() indexes them, and can run on a background thread
+
+	"""
+
+	def __init__(self):
+		# Words mapped to the names of the controllers they appear in
+		self.postings = {}
+		# Names of controllers mapped to the words they were indexed under, so they can be removed again
+		self.words = {}
+		# Sorted list of every word, rebuilt the next time we search after words are added or removed
+		self.sortedWords = []
+		self.dirty = False
+		# Controllers added since the last build
+		self.pending = {}
+		# Controllers removed while a build was tokenizing them, so it doesn't add them back
+		self.removed = set()
+		# Prefixes mapped to the names of the controllers they match, until the index changes
+		self.prefixes = {}
+		# Guards everything above, only held briefly so adding controllers never waits on a build
+		self.lock = threading.Lock()
+		# Held for a whole build, so searches wait for the one in progress instead of seeing half of it
+		self.buildLock = threading.Lock()
+
+
+	def add(self, name, info):
+		"""
+		Adds a controller to the index, replacing it if it was already there
+		Args:
+			name (str): name of the controller
+			info (dict): the info of the controller
+
+		"""
+		with self.lock:
+			self.pending[name] = info
+
+
+	def remove(self, name):
+		"""
+		Removes a controller from the index
+		Args:
+			name (str): name of the controller
+
+		"""
+		with self.lock:
+			self.pending.pop(name, None)
+			self.removed.add(name)
+			self.unindex(name)
+
+
+	def unindex(self, name):
+		"""
+		Takes the words of a controller out of the index. Only call it while holding the lock
+		Args:
+			name (str): name of the controller
+
+		"""
+		words = self.words.pop(name, None)
+		if words is None:
+			return
+
+		for word in words:
+			names = self.postings[word]
+			names.discard(name)
+			if not names:
+				del self.postings[word]
+				self.dirty = True
+		self.prefixes = {}
+
+
+	def clear(self):
+		"""
+		Removes every controller from the index
+		"""
+		with self.lock:
+			self.postings = {}
+			self.words = {}
+			self.sortedWords = []
+			self.dirty = False
+			self.pending = {}
+			self.removed = set()
+			self.prefixes = {}
+
+
+	def build(self):
+		"""
+		Indexes the controllers that were added since the last build. Words are worked out without holding
+		the lock, so the library can keep changing (and the UI keep responding) while this runs on another thread
+		"""
+		with self.buildLock:
+			with self.lock:
+				pending = self.pending
+				self.pending = {}
+				self.removed = set()
+
+			names = list(pending)
+			for start in range(0, len(names), BUILDCHUNKSIZE):
+				chunk = []
+				for position, name in enumerate(names[start:start + BUILDCHUNKSIZE], start):
+					try:
+						chunk.append((name, self.tokenizeInfo(name, pending[name])))
+					except Exception:
+						# Put back everything else we haven't indexed yet, so one bad controller doesn't lose the rest of them
+						with self.lock:
+							for name in names[start:position] + names[position + 1:]:
+								if name not in self.removed and name not in self.pending:
+									self.pending[name] = pending[name]
+						raise
+
+				with self.lock:
+					for name, words in chunk:
+						# Removed, or added again with newer info, while we were working out its words
+						if name in self.removed or name in self.pending:
+							continue
+
+						self.unindex(name)
+						self.words[name] = words
+						for word in words:
+							if word not in self.postings:
+								self.postings[word] = set()
+								self.dirty = True
+							self.postings[word].add(name)
+					self.prefixes = {}
+
+			# Sort the words here rather than in the first search, which may be waiting on the GUI thread
+			with self.lock:
+				if self.dirty:
+					self.sortedWords = sorted(self.postings)
+					self.dirty = False
+
+				# The first letter typed matches the most controllers, have those ready before anyone types it
+				for letter in sorted(set(word[0] for word in self.sortedWords)):
+					self.prefixMatches(letter)
+
+
+	def tokenizeInfo(self, name, info):
+		"""
+		Works out every word a controller is indexed under
+		Args:
+			name (str): name of the controller
+			info (dict): the info of the controller
+
+		Returns:
+			set
+
+		"""
+		words = set(tokenize(name))
+		for field, value in info.items():
+			if field in SKIPFIELDS:
+				continue
+			if not isinstance(value, TEXTTYPES):
+				value = json.dumps(value, ensure_ascii=False, default=repr)
+			# Each word is indexed on its own and under its field, so 'tags:arm' only matches the tags
+			for word in tokenize(value):
+				words.add(word)
+				words.add('%s:%s' % (field.lower(), word))
+		return words
+
+
+	def prefixMatches(self, prefix):
+		"""
+		Finds every controller with a word starting with a prefix. Only call it while holding the lock
+		Args:
+			prefix (str): the prefix
+
+		Returns:
+			frozenset: names of the controllers, shared with later searches so it mustn't be changed
+
+		"""
+		matches = self.prefixes.get(prefix)
+		if matches is not None:
+			return matches
+
+		matches = set()
+		# Every word starting with the prefix sits together in the sorted list
+		i = bisect.bisect_left(self.sortedWords, prefix)
+		while i < len(self.sortedWords) and self.sortedWords[i].startswith(prefix):
+			matches.update(self.postings[self.sortedWords[i]])
+			i += 1
+
+		if len(self.prefixes) >= PREFIXCACHESIZE:
+			self.prefixes = {}
+		matches = self.prefixes[prefix] = frozenset(matches)
+		return matches
+
+
+	def search(self, query):
+		"""
+		Finds the controllers matching every word of a query. Words match by prefix,
+		and a word written as field:value only matches that info field
+		Args:
+			query (str): the text to search for
+
+		Returns:
+			set: names of the matching controllers
+
+		"""
+		# Anything added since the last build is indexed now, or once the build in progress finishes
+		if self.pending:
+			self.build()
+
+		with self.buildLock:
+			with self.lock:
+				return self.searchIndexed(query)
+
+
+	def searchIndexed(self, query):
+		"""
+		Runs a search over what has been indexed. Only call it while holding the lock
+		Args:
+			query (str): the text to search for
+
+		Returns:
+			set: names of the matching controllers
+
+		"""
+		if self.dirty:
+			self.sortedWords = sorted(self.postings)
+			self.dirty = False
+
+		results = None
+		for term in query.split():
+			# Split field:value terms so the value gets tokenized the same way it was indexed
+			field, separator, value = term.rpartition(':')
+			words = tokenize(value)
+			if separator:
+				words = ['%s:%s' % (field.lower(), word) for word in words]
+
+			for prefix in words:
+				# Cheaper to check the few results we have than to gather every word with this prefix
+				if results is not None and len(results) < NARROWED:
+					results = set(name for name in results
+								  if any(word.startswith(prefix) for word in self.words[name]))
+					if not results:
+						return set()
+					continue
+
+				matches = self.prefixMatches(prefix)
+				results = matches if results is None else results & matches
+				if not results:
+					return set()
+
+		# An empty query matches everything
+		if results is None:
+			return set(self.words)
+
+		# Cached matches are shared, hand back a set of the caller's own
+		return set(results)
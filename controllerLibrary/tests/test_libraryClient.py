@@ -0,0 +1,146 @@
+# Tests the library client against a library server on localhost
+# Run them with mayapy: mayapy -m unittest discover controllerLibrary/tests
+# Interact with our OS
+import os
+import sys
+# Use JSON module to write out the controllers' info
+import json
+# Temporary libraries and caches
+import tempfile
+import shutil
+# The server answers requests on its own thread
+import threading
+import unittest
+
+try:
+	# Maya's commands need Maya running when we're outside of it
+	import maya.standalone
+	maya.standalone.initialize()
+except (ImportError, RuntimeError):
+	pass
+
+# The library's modules import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import libraryCache
+import libraryClient
+import libraryServer
+
+
+class TestLibraryClient(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.cacheDirectory = tempfile.mkdtemp()
+		self.writeController('ctrl', b'//Maya ASCII\ncreateNode transform -n "oldCtrl";\n')
+
+		# Rescan the library for every request, so changes show up straight away
+		self.rescanInterval = libraryServer.RESCANINTERVAL
+		libraryServer.RESCANINTERVAL = 0
+		self.server = libraryServer.LibraryServer(self.directory, 0)
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.start()
+
+		self.library = libraryClient.RemoteLibrary('http://127.0.0.1:%d' % self.server.server_address[1])
+		self.library.cache = libraryCache.ReadThroughCache(self.cacheDirectory)
+
+		# Count the requests the client sends
+		self.requests = []
+		open = self.library.client.open
+
+		def countingOpen(path, headers=None):
+			self.requests.append((path, dict(headers or {})))
+			return open(path, headers)
+
+		self.library.client.open = countingOpen
+
+
+	def tearDown(self):
+		# Let the server's threads finish with the kept-alive connections
+		for connection in self.library.client.idle:
+			connection.close()
+		self.server.shutdown()
+		self.server.server_close()
+		self.thread.join()
+		libraryServer.RESCANINTERVAL = self.rescanInterval
+		shutil.rmtree(self.directory)
+		shutil.rmtree(self.cacheDirectory)
+
+
+	def writeController(self, name, data, mtime=None):
+		"""
+		Writes a controller into the served library
+		Args:
+			self (obj): reference itself
+			name (str): name of the controller
+			data (bytes): its maya file
+			mtime (float): the modification time to give the maya file
+
+		"""
+		path = os.path.join(self.directory, '%s.ma' % name)
+		with open(path, 'wb') as f:
+			f.write(data)
+		if mtime is not None:
+			os.utime(path, (mtime, mtime))
+
+		with open(os.path.join(self.directory, '%s.json' % name), 'w') as f:
+			json.dump({'name': name}, f)
+
+
+	def test_refreshUnchangedSendsOneRequest(self):
+		self.library.find()
+		del self.requests[:]
+
+		self.assertEqual(self.library.refresh(), ([], [], []))
+		self.assertEqual(len(self.requests), 1)
+		self.assertEqual(self.requests[0][1].get('If-None-Match'), self.library.etag)
+
+
+	def test_resumeOfChangedFileRestarts(self):
+		self.library.find()
+		url = self.library['ctrl']['path']
+		oldTag = libraryServer.fileTag(self.library.stats[url])
+
+		# Leave a download of the old version behind, interrupted part of the way through
+		partPath = self.library.cache.localPath(url) + '.tmp.part'
+		os.makedirs(os.path.dirname(partPath))
+		with open(partPath, 'wb') as f:
+			f.write(b'//Maya ASCII\ncreateN')
+		with open(partPath + '.etag', 'w') as f:
+			f.write(oldTag)
+
+		# Change the controller on the server, keeping its size so only the ETag can tell the versions apart
+		newData = b'//Maya ASCII\ncreateNode transform -n "newCtrl";\n'
+		mtime = os.path.getmtime(os.path.join(self.directory, 'ctrl.ma')) + 10
+		self.writeController('ctrl', newData, mtime)
+
+		self.assertEqual(self.library.refresh(), ([], ['ctrl'], []))
+		with open(self.library.localPath('ctrl'), 'rb') as f:
+			self.assertEqual(f.read(), newData)
+
+		download = [headers for path, headers in self.requests if path.startswith('/files/')][-1]
+		self.assertNotIn('Range', download)
+		self.assertFalse(os.path.exists(partPath))
+		self.assertFalse(os.path.exists(partPath + '.etag'))
+
+
+	def test_resumeOfSameFileContinues(self):
+		data = b'//Maya ASCII\ncreateNode transform -n "oldCtrl";\n'
+		self.library.find()
+		url = self.library['ctrl']['path']
+
+		partPath = self.library.cache.localPath(url) + '.tmp.part'
+		os.makedirs(os.path.dirname(partPath))
+		with open(partPath, 'wb') as f:
+			f.write(data[:20])
+		with open(partPath + '.etag', 'w') as f:
+			f.write(libraryServer.fileTag(self.library.stats[url]))
+
+		with open(self.library.localPath('ctrl'), 'rb') as f:
+			self.assertEqual(f.read(), data)
+
+		download = [headers for path, headers in self.requests if path.startswith('/files/')][-1]
+		self.assertEqual(download['Range'], 'bytes=20-')
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,262 @@
+from Qt import QtCore, QtGui
+# Interact with our OS
+import os
+# Use JSON module to write out the offset table
+import json
+# Memory map the atlas so we only read the thumbnails we draw
+import mmap
+# Pack the table location into bytes
+import struct
+# Name the new atlas after the thread writing it
+import threading
+import controllerLibrary
+
+# Name of the atlas file that lives inside the library directory
+ATLASNAME = 'thumbnails.atlas'
+
+# The thumbnail sizes we keep in the atlas
+SIZES = controllerLibrary.THUMBNAILSIZES
+
+# Marks the start of an atlas file
+MAGIC = b'CLTA'
+
+# The magic is followed by the offset and length of the offset table
+HEADER = struct.Struct('<4sQI')
+
+
+def encodeThumbnail(path, size):
+	"""
+	Scales an image down and encodes it as a JPEG
+	Args:
+		path (str): path of the image
+		size (int): the size to fit it in
+
+	Returns:
+		bytes: the encoded image, or None if it couldn't be read
+
+	"""
+	# QImage (unlike QPixmap) is safe to use outside of the GUI thread
+	image = QtGui.QImage(path)
+	if image.isNull():
+		return None
+
+	image = image.scaled(size, size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+
+	buffer = QtCore.QBuffer()
+	buffer.open(QtCore.QIODevice.WriteOnly)
+	image.save(buffer, 'JPG')
+	return bytes(buffer.data())
+
+
+def readThumbnail(path, size):
+	"""
+	Gets a thumbnail of a screenshot, using one rendered at that size by thumbnailBatch if it is up to date
+	Args:
+		path (str): path of the screenshot
+		size (int): the size to fit it in
+
+	Returns:
+		bytes: the encoded image, or None if it couldn't be read
+
+	"""
+	rendered = os.path.join(os.path.dirname(path), controllerLibrary.THUMBNAILDIRECTORY, str(size), os.path.basename(path))
+	if os.path.exists(rendered) and os.path.getmtime(rendered) >= os.path.getmtime(path):
+		with open(rendered, 'rb') as f:
+			return f.read()
+
+	return encodeThumbnail(path, size)
+
+
+class ThumbnailAtlas(object):
+	"""
+	A single file holding every thumbnail of a library, pre-scaled to a few sizes.
+	The thumbnails are followed by an offset table saying where each one is, and a small header at the
+	start of the file points at that table. Opening the library browser only opens this one file
+	instead of thousands of screenshots
+
+	"""
+
+	def __init__(self, directory, sizes=SIZES):
+		# The atlas is stored next to the controllers it describes
+		self.directory = directory
+		self.path = os.path.join(directory, ATLASNAME)
+		self.sizes = sizes
+
+		# Controller names mapped to the fingerprint of their screenshot and where each size is stored
+		self.table = {}
+		self.file = None
+		self.map = None
+
+		self.open()
+
+
+	def open(self):
+		"""
+		Memory maps the atlas file and reads its offset table
+		"""
+		self.close()
+		if not os.path.exists(self.path) or not os.path.getsize(self.path):
+			return
+
+		self.file = open(self.path, 'rb')
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		# Ignore anything that isn't an atlas, it'll get written over on the next build
+		if len(self.map) < HEADER.size or self.map[:4] != MAGIC:
+			self.close()
+			return
+
+		magic, tableOffset, tableLength = HEADER.unpack(self.map[:HEADER.size])
+		self.table = json.loads(self.map[tableOffset:tableOffset + tableLength].decode('utf-8'))
+
+
+	def close(self):
+		"""
+		Releases the atlas file
+		"""
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+		self.table = {}
+
+
+	def get(self, name, size, source):
+		"""
+		Gets a thumbnail from the atlas
+		Args:
+			name (str): name of the controller
+			size (int): size of the thumbnail
+			source (list): the [mtime, size] of the controller's screenshot
+
+		Returns:
+			bytes: the encoded thumbnail, or None if it isn't in the atlas or the screenshot changed since
+
+		"""
+		entry = self.table.get(name)
+		if not entry or entry['source'] != source:
+			return None
+
+		location = entry['sizes'].get(str(size))
+		if not location:
+			return None
+
+		offset, length = location
+		return self.map[offset:offset + length]
+
+
+	def isStale(self, screenshots):
+		"""
+		Checks whether the atlas is missing thumbnails or holds ones that changed or were deleted
+		Args:
+			screenshots (dict): controller names mapped to (path, [mtime, size]) of their screenshots
+
+		Returns:
+			bool
+
+		"""
+		if set(screenshots) != set(self.table):
+			return True
+
+		for name, (path, source) in screenshots.items():
+			if self.table[name]['source'] != source:
+				return True
+
+		return False
+
+
+	def build(self, screenshots):
+		"""
+		Writes a new atlas next to the current one, reusing the thumbnails that haven't changed.
+		This is safe to run on a background thread, call replace() on the GUI thread to start using it
+		Args:
+			screenshots (dict): controller names mapped to (path, [mtime, size]) of their screenshots
+
+		Returns:
+			str: path of the new atlas
+
+		"""
+		table = {}
+		# Other Maya sessions may be building an atlas of the same library right now
+		tempPath = '%s.%d.%d.tmp' % (self.path, os.getpid(), threading.current_thread().ident)
+		if not os.path.exists(self.directory):
+			os.makedirs(self.directory)
+
+		# Thumbnails are written out as soon as they are encoded so they never pile up in memory
+		with open(tempPath, 'wb') as f:
+			# Leave room for the header, we only know where the table goes once the thumbnails are written
+			f.write(b'\0' * HEADER.size)
+			offset = HEADER.size
+
+			for name, (path, source) in sorted(screenshots.items()):
+				sizes = {}
+				for size in self.sizes:
+					# Only scale the screenshots that changed since the last build
+					data = self.get(name, size, source)
+					if data is None:
+						data = readThumbnail(path, size)
+					if data is None:
+						continue
+
+					f.write(data)
+					sizes[str(size)] = [offset, len(data)]
+					offset += len(data)
+
+				table[name] = {'source': source, 'sizes': sizes}
+
+			tableData = json.dumps(table).encode('utf-8')
+			f.write(tableData)
+
+			f.seek(0)
+			f.write(HEADER.pack(MAGIC, offset, len(tableData)))
+
+		return tempPath
+
+
+	def replace(self, tempPath):
+		"""
+		Swaps the atlas for a new one written by build(), keeping the current one if it can't be replaced
+		Args:
+			tempPath (str): path of the new atlas
+
+		"""
+		# The old file has to be released before Windows lets us replace it
+		self.close()
+		try:
+			try:
+				os.rename(tempPath, self.path)
+			except OSError:
+				# Windows won't rename over a file
+				os.remove(self.path)
+				os.rename(tempPath, self.path)
+		except OSError:
+			# Another Maya session has the atlas open, keep using it and drop ours
+			if os.path.exists(tempPath):
+				os.remove(tempPath)
+		self.open()
+
+
+class BuildSignals(QtCore.QObject):
+	"""
+	QRunnable isn't a QObject, so its signals have to live on a separate object
+	"""
+	built = QtCore.Signal(str)
+
+
+class BuildTask(QtCore.QRunnable):
+	"""
+	Builds a new atlas on a background thread
+	"""
+
+	def __init__(self, atlas, screenshots):
+		super(BuildTask, self).__init__()
+		self.atlas = atlas
+		self.screenshots = screenshots
+		self.signals = BuildSignals()
+
+
+	def run(self):
+		# Signals are queued back to the GUI thread
+		self.signals.built.emit(self.atlas.build(self.screenshots))
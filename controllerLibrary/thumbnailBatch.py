@@ -0,0 +1,250 @@
+# Regenerate the thumbnails of a whole library with headless Maya, across all cores
+# Run it with mayapy: mayapy thumbnailBatch.py [directory] [--processes N] [--force]
+# Interact with our OS
+import os
+# Talk to the workers a line of JSON at a time
+import json
+# Hand controllers out to one worker per thread
+import threading
+from multiprocessing.pool import ThreadPool
+import multiprocessing
+# Each worker is a mayapy process of its own
+import subprocess
+# Move rendered images into the library
+import shutil
+import argparse
+import sys
+
+# controllerLibrary is only imported once Maya is running, it asks Maya where the library lives
+
+# The mayapy to run workers with, the one running us unless told otherwise
+MAYAPY = os.environ.get('MAYAPY', sys.executable)
+
+# Marks the lines workers answer with, Maya prints plenty of its own
+RESULT = 'thumbnailBatch:'
+
+
+def thumbnailPaths(name, directory, sizes):
+	"""
+	Gets where the thumbnails of a controller go
+	Args:
+		name (str): name of the controller
+		directory (str): the library directory
+		sizes (list): the thumbnail sizes to render besides the screenshot
+
+	Returns:
+		list: [path, size] pairs, starting with the controller's screenshot
+
+	"""
+	import controllerLibrary
+	# The screenshot comes first, so the thumbnails rendered after it count as up to date
+	paths = [[os.path.join(directory, '%s.jpg' % name), controllerLibrary.SCREENSHOTSIZE]]
+	for size in sizes:
+		paths.append([os.path.join(directory, controllerLibrary.THUMBNAILDIRECTORY, str(size), '%s.jpg' % name), size])
+	return paths
+
+
+def isFresh(path, thumbnails):
+	"""
+	Checks whether every thumbnail of a controller is newer than its maya file
+	Args:
+		path (str): path of the controller's maya file
+		thumbnails (list): [path, size] pairs of its thumbnails
+
+	Returns:
+		bool
+
+	"""
+	mtime = os.path.getmtime(path)
+	return all(os.path.exists(thumbnail) and os.path.getmtime(thumbnail) >= mtime for thumbnail, size in thumbnails)
+
+
+def renderThumbnails(path, thumbnails):
+	"""
+	Opens a controller as the scene and renders its thumbnails offscreen, leaving every viewport alone
+	Args:
+		path (str): path of the controller's maya file
+		thumbnails (list): [path, size] pairs of the thumbnails to render
+
+	"""
+	from maya import cmds
+	import controllerLibrary
+
+	# Every controller gets a clean scene of its own
+	cmds.file(new=True, force=True)
+	cmds.file(controllerLibrary.localMayaFile(path), open=True, force=True)
+
+	# Look at the controller from above and to the side, like the default perspective view
+	camera = cmds.camera()[0]
+	cmds.xform(camera, rotation=(-30, 45, 0))
+
+	with controllerLibrary.screenshotRenderGlobals():
+		for thumbnail, size in thumbnails:
+			# Framing depends on the aspect ratio, so fit for each size
+			cmds.setAttr('defaultResolution.width', size)
+			cmds.setAttr('defaultResolution.height', size)
+			cmds.viewFit(camera, all=True)
+
+			# Viewport 2.0 renders without a viewport, into the project's images folder
+			rendered = cmds.ogsRender(camera=camera, currentFrame=True, width=size, height=size)
+
+			folder = os.path.dirname(thumbnail)
+			if not os.path.exists(folder):
+				os.makedirs(folder)
+			if os.path.exists(thumbnail):
+				os.remove(thumbnail)
+			shutil.move(rendered, thumbnail)
+
+
+def work():
+	"""
+	Runs as a worker: renders the controllers sent to it a line at a time until its input is closed
+	"""
+	import maya.standalone
+	maya.standalone.initialize()
+
+	for line in iter(sys.stdin.readline, ''):
+		job = json.loads(line)
+		try:
+			renderThumbnails(job['path'], job['thumbnails'])
+			result = {}
+		except Exception as e:
+			result = {'error': str(e)}
+
+		sys.stdout.write(RESULT + json.dumps(result) + '\n')
+		sys.stdout.flush()
+
+
+class Worker(object):
+	"""
+	A mayapy process rendering thumbnails. Starting Maya takes a while, so each worker
+	renders many controllers, opening each one as a new scene
+	"""
+
+	def __init__(self, mayapy=MAYAPY):
+		self.mayapy = mayapy
+		self.process = None
+
+
+	def start(self):
+		"""
+		Starts the mayapy process
+		"""
+		script = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+		self.process = subprocess.Popen([self.mayapy, script, '--worker'], stdin=subprocess.PIPE,
+										stdout=subprocess.PIPE, universal_newlines=True)
+
+
+	def render(self, path, thumbnails):
+		"""
+		Renders the thumbnails of a controller
+		Args:
+			path (str): path of the controller's maya file
+			thumbnails (list): [path, size] pairs of the thumbnails to render
+
+		Returns:
+			str: what went wrong, or None if it worked
+
+		"""
+		# Start (or restart, if a controller crashed Maya) the process
+		if self.process is None or self.process.poll() is not None:
+			self.start()
+
+		self.process.stdin.write(json.dumps({'path': path, 'thumbnails': thumbnails}) + '\n')
+		self.process.stdin.flush()
+
+		for line in iter(self.process.stdout.readline, ''):
+			if line.startswith(RESULT):
+				return json.loads(line[len(RESULT):]).get('error')
+
+		return 'mayapy exited while rendering'
+
+
+	def close(self):
+		"""
+		Lets the mayapy process finish and waits for it
+		"""
+		if self.process is not None:
+			self.process.stdin.close()
+			self.process.wait()
+			self.process = None
+
+
+def regenerate(directory=None, processes=None, sizes=None, force=False, mayapy=MAYAPY):
+	"""
+	Renders the thumbnails of every controller in a library on a pool of headless mayapy processes,
+	skipping controllers whose thumbnails are newer than their maya file
+	Args:
+		directory (str): the library directory
+		processes (int): how many mayapy processes to run, defaults to one per core
+		sizes (list): the thumbnail sizes to render besides the screenshot, defaults to the UI's sizes
+		force (bool): render every controller, even the ones that are up to date
+		mayapy (str): the mayapy to run the workers with
+
+	Returns:
+		dict: names of the controllers that failed mapped to what went wrong
+
+	"""
+	import controllerLibrary
+	directory = directory or controllerLibrary.DIRECTORY
+	sizes = sizes or controllerLibrary.THUMBNAILSIZES
+
+	library = controllerLibrary.ControllerLibrary(roots=[directory])
+	library.find()
+
+	jobs = []
+	for name in sorted(library):
+		thumbnails = thumbnailPaths(name, directory, sizes)
+		if force or not isFresh(library[name]['path'], thumbnails):
+			jobs.append((name, library[name]['path'], thumbnails))
+
+	print('Rendering thumbnails for %d of %d controllers' % (len(jobs), len(library)))
+	if not jobs:
+		return {}
+
+	# Each thread drives a worker of its own
+	local = threading.local()
+	workers = []
+	lock = threading.Lock()
+
+	def render(job):
+		name, path, thumbnails = job
+		worker = getattr(local, 'worker', None)
+		if worker is None:
+			worker = local.worker = Worker(mayapy)
+			with lock:
+				workers.append(worker)
+		return name, worker.render(path, thumbnails)
+
+	failures = {}
+	pool = ThreadPool(min(processes or multiprocessing.cpu_count(), len(jobs)))
+	try:
+		for count, (name, error) in enumerate(pool.imap_unordered(render, jobs), 1):
+			if error:
+				failures[name] = error
+			print('[%d/%d] %s%s' % (count, len(jobs), name, ': %s' % error if error else ''))
+	finally:
+		pool.close()
+		pool.join()
+		for worker in workers:
+			worker.close()
+
+	return failures
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Regenerate the thumbnails of a controller library')
+	parser.add_argument('directory', nargs='?', help='the library directory')
+	parser.add_argument('--processes', type=int, help='how many mayapy processes to run')
+	parser.add_argument('--force', action='store_true', help='render controllers whose thumbnails are up to date')
+	parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.worker:
+		work()
+	else:
+		# The library module needs Maya running to find its directory
+		import maya.standalone
+		maya.standalone.initialize()
+		failures = regenerate(args.directory, args.processes, force=args.force)
+		sys.exit(1 if failures else 0)
@@ -0,0 +1,126 @@
+from Qt import QtCore, QtGui
+# Remembers the order thumbnails were used in so we can drop the oldest
+from collections import OrderedDict
+
+# How many thumbnails to keep in memory
+CACHESIZE = 2000
+
+# The cache is shared between every library dialog so reopening one doesn't decode anything again
+_cache = None
+
+
+def getCache():
+	"""
+	Gets the thumbnail cache shared by all library dialogs
+	Returns:
+		ThumbnailCache
+
+	"""
+	global _cache
+	if _cache is None:
+		_cache = ThumbnailCache()
+	return _cache
+
+
+class DecodeSignals(QtCore.QObject):
+	"""
+	QRunnable isn't a QObject, so its signals have to live on a separate object
+	"""
+	decoded = QtCore.Signal(object, QtGui.QImage)
+
+
+class DecodeTask(QtCore.QRunnable):
+	"""
+	Decodes and scales a single thumbnail on a background thread
+	"""
+
+	def __init__(self, key, size, data=None):
+		super(DecodeTask, self).__init__()
+		self.key = key
+		self.size = size
+		self.data = data
+		self.signals = DecodeSignals()
+
+
+	def run(self):
+		# QImage (unlike QPixmap) is safe to use outside of the GUI thread
+		if self.data is not None:
+			image = QtGui.QImage.fromData(self.data)
+		else:
+			image = QtGui.QImage(self.key[0])
+		if not image.isNull():
+			image = image.scaled(self.size, self.size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+
+		# Signals are queued back to the GUI thread
+		self.signals.decoded.emit(self.key, image)
+
+
+class ThumbnailCache(QtCore.QObject):
+	"""
+	Decodes thumbnails on a thread pool and keeps the most recently used ones in memory.
+	Thumbnails are keyed by path and mtime, so a changed screenshot gets decoded again
+	"""
+
+	# Emitted with the path of a thumbnail once it has been decoded
+	thumbnailReady = QtCore.Signal(str)
+
+
+	def __init__(self, size=64, maxSize=CACHESIZE):
+		super(ThumbnailCache, self).__init__()
+		self.size = size
+		self.maxSize = maxSize
+		self.pixmaps = OrderedDict()
+		# Thumbnails being decoded right now, so we don't queue the same one twice
+		self.pending = set()
+		self.pool = QtCore.QThreadPool()
+
+		# Grey square shown while a thumbnail is still being decoded
+		self.placeholder = QtGui.QPixmap(size, size)
+		self.placeholder.fill(QtGui.QColor(60, 60, 60))
+
+
+	def get(self, path, mtime=None, data=None):
+		"""
+		Gets a thumbnail, queuing it to be decoded if it isn't in the cache yet
+		Args:
+			path (str): path of the image
+			mtime (float): modification time of the image
+			data (bytes): the already encoded image (from a thumbnail atlas), so the path isn't read
+
+		Returns:
+			QPixmap: the thumbnail, or None if it is still being decoded
+
+		"""
+		key = (path, mtime)
+		pixmap = self.pixmaps.get(key)
+		if pixmap is not None:
+			# Move it to the end, marking it as the most recently used
+			del self.pixmaps[key]
+			self.pixmaps[key] = pixmap
+			return pixmap
+
+		if key not in self.pending:
+			self.pending.add(key)
+			task = DecodeTask(key, self.size, data)
+			task.signals.decoded.connect(self.decoded)
+			self.pool.start(task)
+
+
+	def decoded(self, key, image):
+		"""
+		Stores a thumbnail that was decoded in the background
+		Args:
+			key (tuple): path and mtime of the image
+			image (QImage): the decoded image
+
+		"""
+		self.pending.discard(key)
+		if image.isNull():
+			return
+
+		self.pixmaps[key] = QtGui.QPixmap.fromImage(image)
+		# Throw away the least recently used thumbnails
+		while len(self.pixmaps) > self.maxSize:
+			self.pixmaps.popitem(last=False)
+
+		self.thumbnailReady.emit(key[0])